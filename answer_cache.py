@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+def _normalise(vector):
+    vector = np.asarray(vector, dtype="float32")
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding; a lookup hits when cosine similarity >= threshold.
+
+    Entries remember the retriever version they were answered against and only
+    match lookups against that same version, so requests served from an older
+    index snapshot don't evict a newer one's answers. Eviction is LRU by size
+    plus a TTL. On disk each store appends one JSON line; the file is rewritten
+    only once it holds twice max_entries lines.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=256, ttl=24 * 3600, path=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()  # key -> entry, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self._next_key = 0
+        self._lines = 0  # Lines in the file at path, live or not
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _purge(self):
+        now = time.time()
+        for key in [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl]:
+            del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def lookup(self, query_embedding, index_version):
+        """Return the cached {"question", "answer", "context"} entry for a similar question, or None."""
+        with self._lock:
+            self._purge()
+            keys = [key for key, entry in self.entries.items() if entry["index_version"] == index_version]
+            if not keys:
+                self.misses += 1
+                return None
+            vectors = np.vstack([self.entries[key]["vector"] for key in keys])
+            scores = vectors @ _normalise(query_embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(keys[best])
+            return self.entries[keys[best]]
+
+    def store(self, question, query_embedding, answer, context, index_version):
+        with self._lock:
+            entry = {
+                "question": question,
+                "vector": _normalise(query_embedding),
+                "answer": answer,
+                "context": list(context),
+                "index_version": index_version,
+                "created": time.time(),
+            }
+            self.entries[self._next_key] = entry
+            self._next_key += 1
+            self._purge()
+            if self._lines >= 2 * self.max_entries:
+                self._save()
+            else:
+                self._append(entry)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._save()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _line(entry):
+        return json.dumps(dict(entry, vector=entry["vector"].tolist()), ensure_ascii=False) + "\n"
+
+    def _append(self, entry):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(self._line(entry))
+        self._lines += 1
+
+    def _save(self):
+        # Rewrites only the live entries, dropping evicted and expired ones from the file
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(self._line(entry) for entry in self.entries.values())
+        os.replace(tmp, self.path)
+        self._lines = len(self.entries)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                entry["vector"] = np.asarray(entry["vector"], dtype="float32")
+            except (ValueError, TypeError, KeyError):
+                continue  # A line cut short by a crash
+            self.entries[self._next_key] = entry
+            self._next_key += 1
+        self._lines = len(lines)
+        # Later lines are newer, so the size limit keeps the most recent answers
+        self._purge()
@@ -0,0 +1,153 @@
+"""Answer a JSONL file of questions against the saved index, without the UI.
+
+    python batch_qa.py questions.jsonl results.jsonl
+    python batch_qa.py questions.jsonl results.jsonl --docs docs/*.pdf --concurrency 4
+
+Each input line is {"question": ...} plus any other fields (ids, expected answers),
+which are copied to the output. Output lines add "answer", "chunk_ids", "context",
+"timings" (seconds) and "error".
+"""
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from config import INDEX_DIR, SEARCH_MODE, RETRIEVE_TOP_K, LLM_CONCURRENCY, VECTOR_PRECISION
+from chunker import chunking_params
+from context_builder import build_context
+from embedder import embed_queries, embedding_dim, MODEL_NAME
+from ingest import ingest_documents, document_id
+from qa_engine import generate_answer
+import qa_engine
+from retriever import FAISSRetriever
+import embedding_cache
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 256  # Questions embedded and searched together
+
+def read_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"question": record}
+            if not record.get("question"):
+                raise ValueError(f"{path}:{line_no}: missing \"question\"")
+            yield record
+
+def load_retriever(index_dir=INDEX_DIR, docs=()):
+    """Reuse the saved index; files in docs that are missing or changed are ingested first."""
+    retriever = FAISSRetriever.load(index_dir, precision=VECTOR_PRECISION)
+    if retriever is None and docs:
+        retriever = FAISSRetriever(dim=embedding_dim())
+    if retriever is None:
+        raise FileNotFoundError(f"No saved index in {index_dir}; pass --docs to build one")
+    hashes = {path: embedding_cache.file_hash(path) for path in docs}
+    doc_ids = {path: document_id(path, hashes[path]) for path in docs}
+    keys = {path: embedding_cache.cache_key(hashes[path], MODEL_NAME, chunking_params()) for path in docs}
+    stale = [(path, doc_ids[path], key) for path, key in keys.items()
+             if not retriever.has_document(doc_ids[path], key)]
+    if stale:
+        _, errors = ingest_documents(stale, retriever)
+        for doc_id, error in errors.items():
+            logger.warning("Failed to ingest %s: %s", doc_id, error)
+        retriever.save(index_dir)
+    return retriever
+
+def _answer(record, passages):
+    start = time.perf_counter()
+    try:
+        record["answer"] = generate_answer(passages, record["question"])
+        record["error"] = None
+    except Exception as e:
+        record["answer"] = None
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["timings"]["generate"] = time.perf_counter() - start
+    return record
+
+def answer_block(records, retriever, pool, top_k=RETRIEVE_TOP_K, mode=SEARCH_MODE, doc_ids=None):
+    """Answer a list of question records, in order.
+
+    Embedding and search run once for the whole block, so their per-question
+    timings are the block time divided by the block size. doc_ids restricts
+    retrieval to those documents.
+    """
+    questions = [record["question"] for record in records]
+
+    start = time.perf_counter()
+    embeddings = embed_queries(questions)
+    embed_s = (time.perf_counter() - start) / len(records)
+
+    start = time.perf_counter()
+    results = retriever.search_ids_batch(embeddings, top_k=top_k, mode=mode, query_texts=questions, doc_ids=doc_ids)
+    search_s = (time.perf_counter() - start) / len(records)
+
+    contexts = []
+    for record, ids, embedding in zip(records, results, embeddings):
+        start = time.perf_counter()
+        passages, stats = build_context(retriever, ids, query_embedding=embedding)
+        record.update(chunk_ids=ids, context=passages, sources=stats["sources"], timings={
+            "embed": embed_s, "search": search_s, "context": time.perf_counter() - start,
+        })
+        contexts.append(passages)
+    return pool.map(_answer, records, contexts)
+
+def run_batch(records, retriever, out, concurrency=LLM_CONCURRENCY, block_size=BLOCK_SIZE,
+              top_k=RETRIEVE_TOP_K, mode=SEARCH_MODE, doc_ids=None):
+    """Answer question records and write one JSON line per record to out; returns stage totals."""
+    # Calls beyond the scheduler's slots would only queue, and queue time counts toward LLM_TIMEOUT
+    limit = qa_engine.scheduler.concurrency
+    if concurrency > limit:
+        logger.warning("--concurrency %d capped at %d, the LLM scheduler's limit (PDFQA_LLM_CONCURRENCY)",
+                       concurrency, limit)
+        concurrency = limit
+    totals = {"questions": 0, "errors": 0, "embed": 0.0, "search": 0.0, "context": 0.0, "generate": 0.0}
+    records = iter(records)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-llm") as pool:
+        while True:
+            block = list(islice(records, block_size))
+            if not block:
+                break
+            for record in answer_block(block, retriever, pool, top_k=top_k, mode=mode, doc_ids=doc_ids):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                totals["questions"] += 1
+                totals["errors"] += record["error"] is not None
+                for stage, seconds in record["timings"].items():
+                    totals[stage] += seconds
+            out.flush()
+            logger.info("Answered %d questions", totals["questions"])
+    totals["wall"] = time.perf_counter() - start
+    return totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL file with a \"question\" per line")
+    parser.add_argument("output", help="JSONL file to write answers to")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--docs", nargs="*", default=[], help="Files to ingest if not already in the index")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY,
+                        help="Parallel LLM calls; capped at PDFQA_LLM_CONCURRENCY, the LLM scheduler's limit")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--top-k", type=int, default=RETRIEVE_TOP_K)
+    parser.add_argument("--mode", default=SEARCH_MODE, choices=("dense", "sparse", "hybrid"))
+    parser.add_argument("--documents", nargs="+", help="Only search these document IDs (e.g. 1a2b3c4d/report.pdf, as listed in the UI)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    retriever = load_retriever(args.index_dir, args.docs)
+    with open(args.output, "w", encoding="utf-8") as out:
+        totals = run_batch(read_questions(args.questions), retriever, out, concurrency=args.concurrency,
+                           block_size=args.block_size, top_k=args.top_k, mode=args.mode, doc_ids=args.documents)
+    n = max(totals["questions"], 1)
+    print(f"{totals['questions']} questions ({totals['errors']} errors) in {totals['wall']:.1f}s")
+    for stage in ("embed", "search", "context", "generate"):
+        print(f"  {stage:<9} {totals[stage]:8.2f}s total  {1000 * totals[stage] / n:8.1f} ms/question")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Recall@k, query latency and size of each index type and storage precision
+against exact float32 flat search.
+
+    python benchmarks/ann_recall.py --n 200000 --k 10
+    python benchmarks/ann_recall.py --index-dir ~/.pdfqa_cache/index --json ann.json
+    python benchmarks/ann_recall.py --types flat --precisions float32 float16 int8
+
+Without --index-dir a clustered synthetic corpus of MiniLM-sized unit vectors is used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retriever import FAISSRetriever, PRECISIONS, SQ_TRAIN_SAMPLE, build_index, _nlist  # noqa: E402
+
+# (index type, search parameter name, values to sweep)
+SWEEPS = [
+    ("flat", None, [None]),
+    ("hnsw", "efSearch", [16, 32, 64, 128, 256]),
+    ("ivf", "nprobe", [1, 4, 8, 16, 32, 64]),
+    ("ivfpq", "nprobe", [1, 4, 8, 16, 32, 64]),
+]
+
+def synthetic_vectors(n, dim, clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(n, dim)).astype("float32")
+    vectors = vectors.astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def perturbed_queries(vectors, rng, noise=0.1):
+    # Unit queries about `noise` (relative) away from corpus vectors
+    dim = vectors.shape[1]
+    queries = (vectors + noise / np.sqrt(dim) * rng.normal(size=vectors.shape)).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+def load_vectors(index_dir):
+    # Keep the saved precision; vectors of a quantized index come back approximately
+    retriever = FAISSRetriever.load(index_dir)
+    if retriever is None:
+        raise SystemExit(f"No index saved in {index_dir}")
+    return retriever.get_vectors(retriever.chunk_store.ids())
+
+def search_params(index_type, value):
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=value)
+    if index_type in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(nprobe=value)
+    return None
+
+def build(index_type, vectors, precision="float32"):
+    n, dim = vectors.shape
+    start = time.perf_counter()
+    index = build_index(index_type, dim, n, precision)
+    if not index.is_trained:
+        sample = vectors[np.random.default_rng(0).permutation(n)[:max(_nlist(n) * 256, SQ_TRAIN_SAMPLE)]]
+        index.train(sample)
+    index.add_with_ids(vectors, np.arange(n, dtype="int64"))
+    return index, time.perf_counter() - start
+
+def run(vectors, queries, k, types=None, precisions=PRECISIONS):
+    exact = faiss.IndexFlatIP(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type, param, values in SWEEPS:
+        if types and index_type not in types:
+            continue
+        # PQ codes replace the stored vectors, so precision does not apply to IVF-PQ
+        for precision in (["float32"] if index_type == "ivfpq" else precisions):
+            rows.extend(run_one(vectors, queries, truth, k, index_type, precision, param, values))
+    return rows
+
+def run_one(vectors, queries, truth, k, index_type, precision, param, values):
+    rows = []
+    try:
+        index, build_s = build(index_type, vectors, precision)
+    except RuntimeError as e:
+        print(f"skipping {index_type}/{precision}: {e}", file=sys.stderr)
+        return rows
+    memory_mb = len(faiss.serialize_index(index)) / 1e6
+    for value in values:
+        params = search_params(index_type, value)
+        latencies = []
+        found = np.empty_like(truth)
+        # One query per call, as in interactive chat
+        for q in range(len(queries)):
+            start = time.perf_counter()
+            _, I = index.search(queries[q:q + 1], k, params=params)
+            latencies.append(time.perf_counter() - start)
+            found[q] = I[0]
+        recall = np.mean([len(set(found[q]) & set(truth[q])) / k for q in range(len(queries))])
+        rows.append({
+            "index_type": index_type,
+            "precision": precision,
+            "param": param,
+            "value": value,
+            "recall_at_k": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 3),
+            "build_s": round(build_s, 2),
+            "memory_mb": round(memory_mb, 1),
+            "bytes_per_vector": round(memory_mb * 1e6 / len(vectors), 1),
+        })
+    return rows
+
+def print_table(rows, n, k):
+    print(f"\nrecall@{k} vs exact float32 flat inner-product search, {n} vectors\n")
+    print("| index | precision | param | recall@k | p50 ms | p99 ms | build s | size MB | bytes/vector |")
+    print("|-------|-----------|-------|----------|--------|--------|---------|---------|--------------|")
+    for r in rows:
+        param = f"{r['param']}={r['value']}" if r["param"] else "-"
+        print(f"| {r['index_type']} | {r['precision']} | {param} | {r['recall_at_k']:.4f} | {r['p50_ms']} | "
+              f"{r['p99_ms']} | {r['build_s']} | {r['memory_mb']} | {r['bytes_per_vector']} |")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", help="use vectors from a persisted FAISSRetriever")
+    parser.add_argument("--n", type=int, default=100_000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", choices=[t for t, _, _ in SWEEPS], help="index types (default: all)")
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=list(PRECISIONS))
+    parser.add_argument("--json", help="also write rows to this file")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index_dir) if args.index_dir else synthetic_vectors(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = perturbed_queries(vectors[picks], rng)
+
+    rows = run(vectors, queries, args.k, args.types, args.precisions)
+    print_table(rows, len(vectors), args.k)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"n": len(vectors), "k": args.k, "rows": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Deterministic synthetic documents (PDF/DOCX/TXT/CSV) for benchmarks.
+
+    python benchmarks/corpus.py out_dir --pages 200 --formats pdf txt
+
+Every page carries a few "reference code" facts, so the generated questions
+have known answers that retrieval can be checked against.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+
+WORDS = (
+    "account agreement amount analysis annual approval asset audit balance board budget capacity "
+    "capital carrier certificate claim client compliance component contract control cost coverage "
+    "customer data delivery department deposit design device document energy engine equipment "
+    "estimate facility filing finance forecast freight fund grant hardware incident income index "
+    "insurance inventory invoice ledger license load maintenance manual margin material meter "
+    "module network notice operation order output panel payment period permit policy portfolio "
+    "power pressure procedure process product project property quality quarter rate record "
+    "regulation release renewal report request requirement reserve resource revenue review risk "
+    "safety schedule section sensor service shipment software specification staff standard "
+    "statement storage supplier supply system tariff tax terminal test threshold transfer unit "
+    "update usage valve vendor version voltage warranty weight"
+).split()
+
+FACTS_PER_PAGE = 2
+
+def sentence(rng, min_words=8, max_words=20):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+def paragraph(rng, sentences=5):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+def page_text(rng, doc, page, chars):
+    facts = []
+    parts = []
+    for i in range(FACTS_PER_PAGE):
+        name = f"R{doc}-{page}-{i}"
+        code = f"{rng.randrange(10 ** 6):06d}"
+        facts.append({"question": f"What is reference code {name}?", "expected": code})
+        parts.append(f"Reference code {name} is {code}.")
+    while sum(len(p) for p in parts) < chars:
+        parts.insert(rng.randrange(len(parts) + 1), paragraph(rng))
+    return "\n\n".join(parts), facts
+
+def write_pdf(path, pages):
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+def write_docx(path, pages):
+    import docx
+
+    document = docx.Document()
+    for text in pages:
+        for para in text.split("\n\n"):
+            document.add_paragraph(para)
+        document.add_page_break()
+    document.save(path)
+
+def write_txt(path, pages):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(pages))
+
+def write_csv(path, pages):
+    # One "page" is about 40 rows
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["row", "section", "description"])
+        row = 0
+        for page, text in enumerate(pages):
+            for line in text.split("\n\n"):
+                for sentence_text in line.split(". "):
+                    writer.writerow([row, page, sentence_text.strip()])
+                    row += 1
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt, "csv": write_csv}
+
+def generate(out_dir, pages=50, formats=tuple(WRITERS), files_per_format=1, chars_per_page=2500, seed=0):
+    """Write the corpus to out_dir; returns {"files": [{path, format, pages, chars}], "questions": [...]}."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    files = []
+    questions = []
+    doc = 0
+    for fmt in formats:
+        for _ in range(files_per_format):
+            texts = []
+            for page in range(pages):
+                text, facts = page_text(rng, doc, page, chars_per_page)
+                texts.append(text)
+                questions.extend(dict(fact, doc=doc) for fact in facts)
+            path = os.path.join(out_dir, f"doc{doc:03d}.{fmt}")
+            WRITERS[fmt](path, texts)
+            files.append({"path": path, "format": fmt, "pages": pages, "chars": sum(len(t) for t in texts)})
+            doc += 1
+    rng.shuffle(questions)
+    return {"files": files, "questions": questions}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--pages", type=int, default=50, help="pages per file")
+    parser.add_argument("--formats", nargs="+", default=list(WRITERS), choices=list(WRITERS))
+    parser.add_argument("--files-per-format", type=int, default=1)
+    parser.add_argument("--chars-per-page", type=int, default=2500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = generate(args.out_dir, args.pages, args.formats, args.files_per_format, args.chars_per_page, args.seed)
+    with open(os.path.join(args.out_dir, "questions.jsonl"), "w", encoding="utf-8") as f:
+        for question in corpus["questions"]:
+            f.write(json.dumps(question) + "\n")
+    print(f"Wrote {len(corpus['files'])} files and {len(corpus['questions'])} questions to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Chunks/sec, startup time, memory and agreement of the embedding backends.
+
+    python benchmarks/embed_backends.py
+    python benchmarks/embed_backends.py --chunks 5000 --backends torch onnx-int8 --json embed.json
+
+onnx-* need `python export_onnx.py --quantize` first. Each backend runs in a
+fresh process. Startup covers the import and the model load, and RSS is
+measured after loading and at peak. Cosine compares each backend's unit vectors
+with the torch ones for the same chunks.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+BACKENDS = ("torch", "onnx-fp32", "onnx-int8")
+COMPARE_CHUNKS = 256
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def make_chunks(n, seed=0):
+    # Chunk-sized paragraphs (about CHUNK_TOKENS tokens), sorted by length like embed_corpus batches
+    from corpus import paragraph
+
+    rng = random.Random(seed)
+    return sorted((paragraph(rng, sentences=rng.randint(2, 6)) for _ in range(n)), key=len)
+
+def load(backend, model, onnx_dir):
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model, device="cpu")
+    from onnx_embedder import OnnxEncoder
+    return OnnxEncoder.load(onnx_dir, quantized=backend == "onnx-int8")
+
+def _run(backend, args, results):
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    encoder = load(backend, args.model, args.onnx_dir)
+    startup = time.perf_counter() - start
+    loaded_rss = rss_mb()
+
+    chunks = make_chunks(args.chunks, args.seed)
+    encoder.encode(chunks[:args.batch_size], batch_size=args.batch_size)  # Warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(encoder.encode(chunks, batch_size=args.batch_size), dtype="float32")
+    seconds = time.perf_counter() - start
+    sample = vectors[::max(1, len(vectors) // COMPARE_CHUNKS)][:COMPARE_CHUNKS]
+    results.put({
+        "startup_s": round(startup, 2),
+        "chunks_per_sec": round(len(chunks) / seconds, 1),
+        "rss_loaded_mb": round(loaded_rss - base_rss, 1),
+        "rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - base_rss, 1),
+        "sample": sample / np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12),
+    })
+
+def run(backend, args):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run, args=(backend, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main():
+    from config import ONNX_DIR
+    from embedder import MODEL_NAME, ENCODE_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformers model for the torch backend")
+    parser.add_argument("--onnx-dir", default=os.path.join(ONNX_DIR, MODEL_NAME))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results here")
+    args = parser.parse_args()
+
+    results = {}
+    reference = None
+    print(f"{'backend':<10} {'chunks/s':>9} {'startup s':>10} {'RSS MB':>7} {'peak MB':>8} {'min cos':>8}")
+    for backend in args.backends:
+        r = run(backend, args)
+        sample = r.pop("sample")
+        if backend == "torch":
+            reference = sample
+        if reference is not None:
+            cosine = np.sum(reference * sample, axis=1)
+            r["cosine_min"], r["cosine_mean"] = round(float(cosine.min()), 6), round(float(cosine.mean()), 6)
+        results[backend] = r
+        print(f"{backend:<10} {r['chunks_per_sec']:>9} {r['startup_s']:>10} {r['rss_loaded_mb']:>7} "
+              f"{r['rss_peak_mb']:>8} {r.get('cosine_min', '-'):>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
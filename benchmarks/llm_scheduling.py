@@ -0,0 +1,93 @@
+"""Answer latency while background summaries are queued, with the LLM scheduler's priorities and with plain FIFO.
+
+    python benchmarks/llm_scheduling.py
+    python benchmarks/llm_scheduling.py --summaries 40 --questions 8 --concurrency 2 --json sched.json
+
+Runs the real qa_engine chains against benchmarks/ollama_stub.py through
+langchain-ollama, so nothing here needs a model. A burst of section summaries
+(one document upload) is submitted first, then questions arrive one at a time.
+Time to first token and answer time are reported for the questions. In FIFO
+mode every chain gets the same priority and summaries may take every slot.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from suite import latency_stats
+
+def run(mode, args, url):
+    import qa_engine
+    from langchain_ollama import OllamaLLM
+    from llm_scheduler import LLMScheduler, INTERACTIVE
+
+    qa_engine.set_llm(OllamaLLM(model="stub", base_url=url))
+    fifo = mode == "fifo"
+    qa_engine.scheduler = LLMScheduler(args.concurrency,
+                                       background_slots=args.concurrency if fifo else args.background_slots)
+    saved = dict(qa_engine.CHAIN_PRIORITY)
+    if fifo:
+        qa_engine.CHAIN_PRIORITY.update((name, INTERACTIVE) for name in saved)
+
+    section = "The pump must be inspected every 500 operating hours. " * 40
+    ttft, total = [], []
+    try:
+        with ThreadPoolExecutor(max_workers=args.summaries) as pool:
+            summaries = [pool.submit(qa_engine.summarize_section, section) for _ in range(args.summaries)]
+            time.sleep(0.05)  # The upload lands just before the first question
+            for i in range(args.questions):
+                start = time.perf_counter()
+                first = None
+                for _ in qa_engine.stream_answer_with_memory([section[:400]], f"Question {i}?", session_id=f"b{i}"):
+                    if first is None:
+                        first = time.perf_counter() - start
+                total.append(time.perf_counter() - start)
+                ttft.append(first if first is not None else total[-1])
+                qa_engine.memory.drop(f"b{i}")
+                time.sleep(args.think)
+            start = time.perf_counter()
+            for future in summaries:
+                future.result()
+            summaries_done = time.perf_counter() - start
+    finally:
+        qa_engine.CHAIN_PRIORITY.update(saved)
+    return {"question_ttft": latency_stats(ttft), "question_total": latency_stats(total),
+            "summaries_left_after_questions_s": round(summaries_done, 2)}
+
+def main():
+    from ollama_stub import start
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summaries", type=int, default=24)
+    parser.add_argument("--questions", type=int, default=6)
+    parser.add_argument("--think", type=float, default=0.2, help="seconds between questions")
+    parser.add_argument("--concurrency", type=int, default=2, help="LLM calls at once (and the stub's --parallel)")
+    parser.add_argument("--background-slots", type=int, default=1)
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0)
+    parser.add_argument("--answer-tokens", type=int, default=30)
+    parser.add_argument("--json", help="write results here")
+    args = parser.parse_args()
+
+    server, url = start(parallel=args.concurrency, tokens_per_sec=args.tokens_per_sec,
+                        answer_tokens=args.answer_tokens)
+    results = {}
+    try:
+        for mode in ("fifo", "priority"):
+            results[mode] = r = run(mode, args, url)
+            print(f"{mode:<9} TTFT p50 {r['question_ttft']['p50_ms']:.0f} ms p99 {r['question_ttft']['p99_ms']:.0f} ms  "
+                  f"answer p50 {r['question_total']['p50_ms']:.0f} ms  "
+                  f"summaries finished {r['summaries_left_after_questions_s']:.2f}s after the last question")
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Local HTTP stand-in for the Ollama API with a fixed latency model, for offline testing.
+
+    python benchmarks/ollama_stub.py --port 11435 --parallel 2 --tokens-per-sec 20
+    PDFQA_OLLAMA_URL=http://127.0.0.1:11435 python ui_gradio.py
+
+Serves /api/generate and /api/chat (streamed NDJSON or a single JSON reply),
+/api/tags and /api/version. Latency follows stub_llm.py. Time to first token is
+base_latency plus the prompt length over prefill_tokens_per_sec, then
+answer_tokens tokens follow at tokens_per_sec. At most `parallel` requests
+generate at once and the rest wait, like OLLAMA_NUM_PARALLEL.
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+
+class StubConfig:
+    def __init__(self, base_latency=0.05, prefill_tokens_per_sec=2000.0, tokens_per_sec=40.0, answer_tokens=40,
+                 parallel=1):
+        self.base_latency = base_latency
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.slots = threading.Semaphore(parallel)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+def _tokens(config, prompt):
+    time.sleep(config.base_latency + len(prompt) / CHARS_PER_TOKEN / config.prefill_tokens_per_sec)
+    # Echo words from the prompt so answers look like text and differ per question
+    words = prompt.split() or ["stub"]
+    for i in range(config.answer_tokens):
+        if i:
+            time.sleep(1.0 / config.tokens_per_sec)
+        yield ("" if i == 0 else " ") + words[(len(prompt) + i * 7) % len(words)]
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+class Handler(BaseHTTPRequestHandler):
+    config = None  # StubConfig, set by make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/":
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"Ollama is running")
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-stub"})
+        elif self.path == "/api/tags":
+            self._json({"models": [{"name": "stub", "model": "stub", "size": 0}]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._json({"error": "not found"}, 404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        chat = self.path == "/api/chat"
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", [])) if chat else request.get("prompt", "")
+        config = self.config
+        start = time.perf_counter()
+        with config.slots:
+            with config.lock:
+                config.requests += 1
+                config.active += 1
+                config.max_active = max(config.max_active, config.active)
+            try:
+                self._reply(request, chat, prompt, start)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client went away (cancelled); free the slot
+            finally:
+                with config.lock:
+                    config.active -= 1
+
+    def _reply(self, request, chat, prompt, start):
+        model = request.get("model", "stub")
+        stream = request.get("stream", True)
+
+        def message(text, done):
+            payload = {"model": model, "created_at": _now(), "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                payload.update(done_reason="stop", total_duration=int((time.perf_counter() - start) * 1e9),
+                               prompt_eval_count=len(prompt) // CHARS_PER_TOKEN, eval_count=self.config.answer_tokens)
+            return payload
+
+        if not stream:
+            self._json(message("".join(_tokens(self.config, prompt)), True))
+            return
+        # Streamed replies are NDJSON until the connection closes, as with HTTP/1.0
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in _tokens(self.config, prompt):
+            self.wfile.write(json.dumps(message(token, False)).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps(message("", True)).encode("utf-8") + b"\n")
+
+def make_server(host="127.0.0.1", port=11435, **latency):
+    """A ThreadingHTTPServer for the stub; port 0 picks a free one. Call serve_forever() to run it."""
+    handler = type("StubHandler", (Handler,), {"config": StubConfig(**latency)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start(host="127.0.0.1", port=0, **latency):
+    """Serve from a background thread; returns (server, base URL)."""
+    server = make_server(host, port, **latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=2000.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--parallel", type=int, default=1, help="requests generating at once (OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, base_latency=args.base_latency,
+                         prefill_tokens_per_sec=args.prefill_tokens_per_sec, tokens_per_sec=args.tokens_per_sec,
+                         answer_tokens=args.answer_tokens, parallel=args.parallel)
+    print(f"Ollama stub on http://{args.host}:{server.server_address[1]}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""In-process stand-in for the Ollama LLM with a simple, fixed latency model.
+
+    import qa_engine
+    from stub_llm import StubLLM
+    qa_engine.set_llm(StubLLM(prefill_tokens_per_sec=2000, tokens_per_sec=40))
+
+Time to first token is `base_latency` plus the prompt length over
+`prefill_tokens_per_sec`, so prompt-size changes show up in the numbers;
+then `answer_tokens` tokens follow at `tokens_per_sec`.
+"""
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+CHARS_PER_TOKEN = 4
+
+class StubLLM(LLM):
+    base_latency: float = 0.05
+    prefill_tokens_per_sec: float = 2000.0
+    tokens_per_sec: float = 40.0
+    answer_tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self, prompt):
+        time.sleep(self.base_latency + len(prompt) / CHARS_PER_TOKEN / self.prefill_tokens_per_sec)
+        # Echo words from the prompt so answers look like text and differ per question
+        words = prompt.split() or ["stub"]
+        for i in range(self.answer_tokens):
+            if i:
+                time.sleep(1.0 / self.tokens_per_sec)
+            yield ("" if i == 0 else " ") + words[(len(prompt) + i * 7) % len(words)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return "".join(self._tokens(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        for token in self._tokens(prompt):
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
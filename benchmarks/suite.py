@@ -0,0 +1,290 @@
+"""Extraction, chunking, embedding, search and end-to-end question benchmarks.
+
+    python benchmarks/suite.py --output bench.json
+    python benchmarks/suite.py --quick --output new.json --compare bench.json
+    python benchmarks/suite.py --stages search --search-sizes 10000 100000
+
+Runs on a generated corpus (see corpus.py) with a stub LLM (see stub_llm.py), so
+numbers depend only on this code and the machine. Caches go to a temporary
+directory unless --cache-dir is given. Results are JSON; --compare prints the
+change of every metric against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+STAGES = ("extraction", "chunking", "embedding", "search", "end_to_end")
+
+def latency_stats(samples):
+    samples = np.asarray(samples) * 1e3
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "mean_ms": round(float(samples.mean()), 3),
+    }
+
+def bench_extraction(files):
+    from pdf_parser import EXTRACTORS
+
+    results = {}
+    texts = {}
+    for file in files:
+        start = time.perf_counter()
+        text = EXTRACTORS["." + file["format"]](file["path"])
+        seconds = time.perf_counter() - start
+        texts[file["path"]] = text
+        results[file["format"]] = {
+            "pages_per_sec": round(file["pages"] / seconds, 1),
+            "mb_per_sec": round(len(text) / 1e6 / seconds, 2),
+        }
+    return results, texts
+
+def bench_chunking(texts, chunk_size, overlap):
+    from chunker import iter_document_chunks
+    from pdf_parser import chunk_text, iter_chunks
+
+    text = "".join(texts)
+    results = {}
+    stats = {}
+    structured = lambda: [chunk for chunk, _, _ in iter_document_chunks(texts, stats=stats, chunker="structured")]
+    for name, fn in (("chunk_text", lambda: chunk_text(text, chunk_size, overlap)),
+                     ("iter_chunks", lambda: list(iter_chunks(texts, chunk_size, overlap))),
+                     ("structured", structured)):
+        start = time.perf_counter()
+        chunks = fn()
+        seconds = time.perf_counter() - start
+        results[name] = {
+            "chunks": len(chunks),
+            "chunks_per_sec": round(len(chunks) / seconds, 1),
+            "mb_per_sec": round(len(text) / 1e6 / seconds, 2),
+        }
+    results["structured"]["duplicates_dropped"] = stats["exact_duplicates"] + stats["near_duplicates"]
+    return results, chunks
+
+def bench_embedding(chunks, repeat_queries):
+    import embedder
+
+    embedder.warmup()
+    start = time.perf_counter()
+    embedder.embed_corpus(chunks)
+    corpus_s = time.perf_counter() - start
+
+    questions = [chunk[:80] for chunk in chunks[:repeat_queries]]
+    embedder.clear_query_cache()
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        embedder.embed_query(question)
+        samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    embedder.embed_queries(questions)
+    batch_s = time.perf_counter() - start
+    embedder.clear_query_cache()
+    start = time.perf_counter()
+    embedder.embed_queries(questions)
+    batch_cold_s = time.perf_counter() - start
+    return {
+        "corpus": {"chunks": len(chunks), "chunks_per_sec": round(len(chunks) / corpus_s, 1)},
+        "query": latency_stats(samples),
+        "query_batch": {"queries_per_sec": round(len(questions) / batch_cold_s, 1)},
+        "query_cached_batch": {"queries_per_sec": round(len(questions) / batch_s, 1)},
+    }
+
+def bench_search(sizes, dim, n_queries, top_k, seed=0):
+    from ann_recall import perturbed_queries, synthetic_vectors
+    from corpus import sentence
+    from retriever import FAISSRetriever
+    import random
+
+    rng = random.Random(seed)
+    results = {}
+    for n in sizes:
+        vectors = synthetic_vectors(n, dim, seed=seed)
+        texts = [sentence(rng) for _ in range(n)]
+        retriever = FAISSRetriever(dim)
+        start = time.perf_counter()
+        for i in range(0, n, 10_000):
+            retriever.add(vectors[i:i + 10_000], texts[i:i + 10_000])
+        build_s = time.perf_counter() - start
+
+        picks = np.random.default_rng(seed + 1).choice(n, size=min(n_queries, n), replace=False)
+        queries = perturbed_queries(vectors[picks], np.random.default_rng(seed + 2))
+        query_texts = [texts[i][:60] for i in picks]
+        row = {"index_type": retriever.active_type, "build_s": round(build_s, 2)}
+        for mode in ("dense", "sparse", "hybrid"):
+            samples = []
+            for query, text in zip(queries, query_texts):
+                start = time.perf_counter()
+                retriever.search_ids(query, top_k=top_k, mode=mode, query_text=text)
+                samples.append(time.perf_counter() - start)
+            row[mode] = latency_stats(samples)
+        start = time.perf_counter()
+        retriever.search_ids_batch(queries, top_k=top_k, mode="dense")
+        row["dense_batch"] = {"queries_per_sec": round(len(queries) / (time.perf_counter() - start), 1)}
+        results[str(n)] = row
+    return results
+
+def bench_end_to_end(files, questions, n_questions, llm_args):
+    import embedding_cache
+    import qa_engine
+    from config import RETRIEVE_TOP_K, SEARCH_MODE
+    from chunker import chunking_params
+    from context_builder import build_context
+    from embedder import embed_query, embedding_dim, MODEL_NAME
+    from ingest import ingest_documents
+    from retriever import FAISSRetriever
+    from stub_llm import StubLLM
+
+    qa_engine.set_llm(StubLLM(**llm_args))
+    docs = []
+    for file in files:
+        key = embedding_cache.cache_key(embedding_cache.file_hash(file["path"]), MODEL_NAME, chunking_params())
+        docs.append((file["path"], os.path.basename(file["path"]), key))
+
+    results = {}
+    for name in ("ingest_cold", "ingest_cached"):
+        retriever = FAISSRetriever(dim=embedding_dim())
+        start = time.perf_counter()
+        counts, _ = ingest_documents(docs, retriever)
+        seconds = time.perf_counter() - start
+        results[name] = {"seconds": round(seconds, 2), "chunks_per_sec": round(sum(counts.values()) / seconds, 1)}
+
+    ttft = []
+    total = []
+    hits = 0
+    asked = questions[:n_questions]
+    for i, question in enumerate(asked):
+        start = time.perf_counter()
+        query_embedding = embed_query(question["question"])
+        ids = retriever.search_ids(query_embedding, top_k=RETRIEVE_TOP_K, mode=SEARCH_MODE,
+                                   query_text=question["question"])
+        passages, _ = build_context(retriever, ids, query_embedding=query_embedding)
+        first = None
+        for _ in qa_engine.stream_answer_with_memory(passages, question["question"], session_id=f"bench-{i}"):
+            if first is None:
+                first = time.perf_counter() - start
+        total.append(time.perf_counter() - start)
+        ttft.append(first if first is not None else total[-1])
+        hits += any(question["expected"] in passage for passage in passages)
+        qa_engine.memory.drop(f"bench-{i}")
+    results["question_ttft"] = latency_stats(ttft)
+    results["question_total"] = latency_stats(total)
+    results["retrieval_hit_rate"] = round(hits / max(len(asked), 1), 4)
+    return results
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(old, new):
+    """Print every metric present in both runs with its relative change."""
+    old_flat = flatten(old["results"])
+    new_flat = flatten(new["results"])
+    print(f"\n{'metric':<55} {'before':>12} {'after':>12} {'change':>9}")
+    for name in sorted(set(old_flat) & set(new_flat)):
+        before, after = old_flat[name], new_flat[name]
+        change = (after - before) / before * 100 if before else 0.0
+        # Throughput should go up, latency and durations down
+        better = change > 0 if name.endswith(("per_sec", "hit_rate")) else change < 0
+        mark = "" if abs(change) < 5 else (" +" if better else " -")
+        print(f"{name:<55} {before:>12} {after:>12} {change:>8.1f}%{mark}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(HERE),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--quick", action="store_true", help="small corpus and sizes, for a fast check")
+    parser.add_argument("--pages", type=int, default=100, help="pages per generated file")
+    parser.add_argument("--formats", nargs="+", default=["pdf", "docx", "txt", "csv"])
+    parser.add_argument("--search-sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embed-chunks", type=int, default=2000)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--llm-prefill-tokens-per-sec", type=float, default=2000.0)
+    parser.add_argument("--cache-dir", help="cache directory (default: a fresh temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.quick:
+        args.pages, args.search_sizes, args.queries, args.embed_chunks = 10, [1_000, 10_000], 50, 500
+
+    work_dir = tempfile.mkdtemp(prefix="pdfqa_bench_")
+    # Must be set before project modules import config
+    os.environ["PDFQA_CACHE_DIR"] = args.cache_dir or os.path.join(work_dir, "cache")
+    os.environ.setdefault("PDFQA_ANSWER_CACHE_PERSIST", "0")
+    from config import CHUNK_SIZE, CHUNK_OVERLAP, RETRIEVE_TOP_K
+    from corpus import generate
+
+    corpus = generate(os.path.join(work_dir, "corpus"), pages=args.pages, formats=args.formats, seed=args.seed)
+    files = corpus["files"]
+    results = {}
+    texts = None
+    chunks = None
+    for stage in args.stages:
+        print(f"Running {stage}…", file=sys.stderr)
+        try:
+            if texts is None and stage in ("extraction", "chunking", "embedding"):
+                extraction, texts = bench_extraction(files)
+            if stage == "extraction":
+                results[stage] = extraction
+            elif stage == "chunking":
+                results[stage], chunks = bench_chunking(list(texts.values()), CHUNK_SIZE, CHUNK_OVERLAP)
+            elif stage == "embedding":
+                if chunks is None:
+                    _, chunks = bench_chunking(list(texts.values()), CHUNK_SIZE, CHUNK_OVERLAP)
+                results[stage] = bench_embedding(chunks[:args.embed_chunks], args.queries)
+            elif stage == "search":
+                results[stage] = bench_search(args.search_sizes, 384, args.queries, RETRIEVE_TOP_K, seed=args.seed)
+            elif stage == "end_to_end":
+                llm_args = {"tokens_per_sec": args.llm_tokens_per_sec,
+                            "prefill_tokens_per_sec": args.llm_prefill_tokens_per_sec}
+                results[stage] = bench_end_to_end(files, corpus["questions"], args.queries, llm_args)
+        except Exception as e:
+            print(f"{stage} failed: {e}", file=sys.stderr)
+            results[stage] = {"error": f"{type(e).__name__}: {e}"}
+
+    run = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), run)
+
+if __name__ == "__main__":
+    main()
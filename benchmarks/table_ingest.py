@@ -0,0 +1,133 @@
+"""Throughput and peak memory of CSV ingestion: whole-file DataFrame.to_string()
+chunking against streaming row groups.
+
+    python benchmarks/table_ingest.py --rows 2000000
+    python benchmarks/table_ingest.py --csv exports/orders.csv --json tables.json
+
+Without --csv a synthetic orders table is generated. Each method runs in a fresh
+process, so peak RSS is its own; embedding is left out, since both methods feed
+the same encoder. "split_rows" counts chunks that start or end inside a row and
+"without_header" chunks that don't name the columns.
+"""
+import argparse
+import csv
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = "late partial refund express damaged gift bulk repeat priority standard return hold".split()
+CATEGORIES = ["hardware", "software", "services", "licenses", "support", "training"]
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["order_id", "date", "customer", "category", "quantity", "amount", "note"])
+        for i in range(rows):
+            writer.writerow([
+                100000 + i,
+                f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                f"C{rng.randint(1, 5000):05d}",
+                rng.choice(CATEGORIES),
+                rng.randint(1, 50),
+                f"{rng.uniform(5, 5000):.2f}",
+                " ".join(rng.choices(WORDS, k=rng.randint(0, 4))),
+            ])
+
+def max_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def whole_file(path):
+    import pandas as pd
+    from chunker import iter_document_chunks
+
+    text = pd.read_csv(path).to_string()
+    header = text.split("\n", 1)[0].split()
+    count = chars = split = without_header = 0
+    for chunk, start, _ in iter_document_chunks([text]):
+        end = start + len(chunk)
+        # to_string pads cells, so a chunk is row-aligned if only spaces separate it from a line break
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", end)
+        split += bool(text[line_start:start].strip() or text[end:line_end if line_end >= 0 else len(text)].strip())
+        without_header += not all(name in chunk for name in header)
+        count += 1
+        chars += len(chunk)
+    return count, chars, split, without_header
+
+def row_groups(path):
+    from chunker import iter_table_chunks
+    from pdf_parser import iter_table_rows
+
+    count = chars = 0
+    for chunk, _, _ in iter_table_chunks(iter_table_rows(path)):
+        count += 1
+        chars += len(chunk)
+    return count, chars, 0, 0
+
+METHODS = {"to_string": whole_file, "row_groups": row_groups}
+
+def _run(name, path, results):
+    # Import both methods' dependencies before the RSS baseline, so module
+    # memory and import time are not charged to whichever method runs
+    for module in ("pandas", "chunker"):
+        importlib.import_module(module)
+
+    base = max_rss_mb()
+    start = time.perf_counter()
+    chunks, chars, split, without_header = METHODS[name](path)
+    seconds = time.perf_counter() - start
+    results.put({"chunks": chunks, "chunk_chars": chars, "seconds": seconds, "split_rows": split,
+                 "without_header": without_header, "peak_rss_mb": max_rss_mb() - base})
+
+def run(name, path):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run, args=(name, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="CSV file to ingest (default: a generated one)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows of the generated CSV")
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    parser.add_argument("--json", help="write results here")
+    args = parser.parse_args()
+
+    path = args.csv
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="pdfqa_tables_"), "orders.csv")
+        print(f"Writing {args.rows} rows to {path}…", file=sys.stderr)
+        write_csv(path, args.rows)
+    mb = os.path.getsize(path) / 1e6
+    with open(path, "rb") as f:
+        rows = sum(1 for _ in f) - 1
+
+    results = {"file_mb": round(mb, 1), "rows": rows}
+    print(f"{'method':<12} {'MB/s':>8} {'rows/s':>10} {'chunks':>9} {'peak MB':>8} {'split':>7} {'no header':>10}")
+    for name in args.methods:
+        r = run(name, path)
+        r.update(mb_per_sec=round(mb / r["seconds"], 2), rows_per_sec=round(rows / r["seconds"]))
+        r["seconds"] = round(r["seconds"], 2)
+        r["peak_rss_mb"] = round(r["peak_rss_mb"], 1)
+        results[name] = r
+        print(f"{name:<12} {r['mb_per_sec']:>8} {r['rows_per_sec']:>10} {r['chunks']:>9} {r['peak_rss_mb']:>8} "
+              f"{r['split_rows']:>7} {r['without_header']:>10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import mmap
+import os
+import numpy as np
+
+NO_DOC = -1
+NO_PAGE = -1
+
+TABLE_EXTENSIONS = (".csv", ".tsv")
+
+def is_table(name):
+    """Tabular documents are chunked in row groups; their page column holds the first data row."""
+    return bool(name) and name.lower().endswith(TABLE_EXTENSIONS)
+
+class ChunkStore:
+    """Chunk texts and provenance in columns, indexed by chunk ID.
+
+    Texts share one UTF-8 buffer addressed by an offsets column, so a chunk costs
+    a few bytes of metadata instead of a Python object. A loaded store
+    memory-maps its buffer from disk and appends new chunks to an in-memory tail.
+    Removed chunks keep their row (IDs are never reused); their text is dropped
+    on the next save.
+    """
+
+    def __init__(self):
+        self._base = b""  # Text loaded from disk (mmap), read-only
+        self._tail = bytearray()  # Text appended since
+        self.size = 0  # Rows, including removed ones
+        self.count = 0  # Live rows
+        self.offsets = np.zeros(1, dtype="int64")  # Row i is buffer[offsets[i]:offsets[i + 1]]
+        self.doc = np.zeros(0, dtype="int32")  # Index into doc_names, or NO_DOC
+        self.page = np.zeros(0, dtype="int32")  # 0-based page (table: data row) the chunk starts on, or NO_PAGE
+        self.start = np.zeros(0, dtype="int64")  # Character offset of the chunk in its document
+        self.alive = np.zeros(0, dtype="bool")
+        self.doc_names = []
+        self._doc_index = {}
+
+    # ---------------- Reading ----------------
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, chunk_id):
+        return 0 <= chunk_id < self.size and bool(self.alive[chunk_id])
+
+    def __getitem__(self, chunk_id):
+        if chunk_id not in self:
+            raise KeyError(chunk_id)
+        lo, hi = int(self.offsets[chunk_id]), int(self.offsets[chunk_id + 1])
+        base_len = len(self._base)
+        if hi <= base_len:
+            return self._base[lo:hi].decode("utf-8")
+        return self._tail[lo - base_len:hi - base_len].decode("utf-8")
+
+    def get(self, chunk_id, default=None):
+        return self[chunk_id] if chunk_id in self else default
+
+    def ids(self):
+        return np.flatnonzero(self.alive[:self.size])
+
+    def __iter__(self):
+        return iter(self.ids().tolist())
+
+    def values(self):
+        return (self[i] for i in self)
+
+    def items(self):
+        return ((i, self[i]) for i in self)
+
+    def doc_of(self, chunk_id):
+        if chunk_id not in self:
+            return None
+        index = self.doc[chunk_id]
+        return None if index == NO_DOC else self.doc_names[index]
+
+    def page_of(self, chunk_id):
+        """1-based page number, or None when the format has no pages."""
+        if chunk_id not in self:
+            return None
+        page = int(self.page[chunk_id])
+        return None if page == NO_PAGE else page + 1
+
+    def span_of(self, chunk_id):
+        """1-based (first, last) page of a chunk, or data rows for a table; (None, None) without either."""
+        first = self.page_of(chunk_id)
+        if first is None:
+            return None, None
+        if is_table(self.doc_of(chunk_id)):
+            # Row groups are a header line plus one line per row
+            return first, first + self[chunk_id].count("\n") - 1
+        return first, first
+
+    def nbytes(self):
+        columns = self.offsets.nbytes + self.doc.nbytes + self.page.nbytes + self.start.nbytes + self.alive.nbytes
+        return len(self._base) + len(self._tail) + columns
+
+    # ---------------- Writing ----------------
+
+    def _reserve(self, size):
+        capacity = len(self.doc)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+        for name in ("doc", "page", "start", "alive"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+        offsets = np.zeros(capacity + 1, dtype="int64")
+        offsets[:self.size + 1] = self.offsets[:self.size + 1]
+        self.offsets = offsets
+
+    def _doc_number(self, doc_id):
+        if doc_id is None:
+            return NO_DOC
+        index = self._doc_index.get(doc_id)
+        if index is None:
+            index = self._doc_index[doc_id] = len(self.doc_names)
+            self.doc_names.append(doc_id)
+        return index
+
+    def append(self, first_id, chunks, doc_id=None, pages=None, starts=None):
+        """Add chunks as rows first_id, first_id + 1, ...; IDs must continue the store."""
+        if first_id != self.size:
+            raise ValueError(f"Chunk IDs must be contiguous: expected {self.size}, got {first_id}")
+        n = len(chunks)
+        self._reserve(self.size + n)
+        end = self.size + n
+        lengths = np.empty(n, dtype="int64")
+        for i, chunk in enumerate(chunks):
+            data = chunk.encode("utf-8")
+            lengths[i] = len(data)
+            self._tail += data
+        self.offsets[self.size + 1:end + 1] = self.offsets[self.size] + np.cumsum(lengths)
+        self.doc[self.size:end] = self._doc_number(doc_id)
+        self.page[self.size:end] = NO_PAGE if pages is None else pages
+        self.start[self.size:end] = -1 if starts is None else starts
+        self.alive[self.size:end] = True
+        self.size = end
+        self.count += n
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype="int64")
+        ids = ids[self.alive[ids]]
+        self.alive[ids] = False
+        self.count -= len(ids)
+
+    def copy(self):
+        clone = ChunkStore()
+        clone._base = self._base  # Read-only, safe to share
+        clone._tail = bytearray(self._tail)
+        clone.size = self.size
+        clone.count = self.count
+        for name in ("offsets", "doc", "page", "start", "alive"):
+            setattr(clone, name, getattr(self, name).copy())
+        clone.doc_names = list(self.doc_names)
+        clone._doc_index = dict(self._doc_index)
+        return clone
+
+    # ---------------- Persistence ----------------
+
+    def save(self, texts_path, columns_path):
+        """Write live texts contiguously to texts_path and the columns to columns_path (.npz)."""
+        n = self.size
+        alive = self.alive[:n]
+        lengths = np.diff(self.offsets[:n + 1]) * alive
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype("int64")
+        base_len = len(self._base)
+        with open(texts_path, "wb") as f:
+            # Write runs of consecutive live rows with one slice each
+            edges = np.flatnonzero(np.diff(np.concatenate([[False], alive, [False]]).astype("int8")))
+            for first, last in zip(edges[::2], edges[1::2]):
+                lo, hi = int(self.offsets[first]), int(self.offsets[last])
+                if lo < base_len:
+                    f.write(self._base[lo:min(hi, base_len)])
+                if hi > base_len:
+                    f.write(self._tail[max(lo, base_len) - base_len:hi - base_len])
+        np.savez(columns_path, offsets=offsets, doc=self.doc[:n], page=self.page[:n],
+                 start=self.start[:n], alive=alive, doc_names=np.array(self.doc_names, dtype=str))
+
+    @classmethod
+    def load(cls, texts_path, columns_path):
+        store = cls()
+        with np.load(columns_path) as columns:
+            store.offsets = columns["offsets"]
+            store.doc = columns["doc"]
+            store.page = columns["page"]
+            store.start = columns["start"]
+            store.alive = columns["alive"]
+            store.doc_names = columns["doc_names"].tolist()
+        store._doc_index = {name: i for i, name in enumerate(store.doc_names)}
+        store.size = len(store.alive)
+        store.count = int(store.alive.sum())
+        if os.path.getsize(texts_path):
+            with open(texts_path, "rb") as f:
+                store._base = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(store._base) != store.offsets[-1]:
+            raise ValueError(f"{texts_path} does not match its columns")
+        return store
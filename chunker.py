@@ -0,0 +1,333 @@
+import hashlib
+import re
+from collections import Counter, deque
+from itertools import chain, islice
+
+import numpy as np
+
+from config import (
+    CHUNKER, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,
+    STRIP_HEADERS, DEDUP, DEDUP_MAX_DISTANCE,
+)
+from context_builder import CHARS_PER_TOKEN, join_overlapping
+from pdf_parser import iter_chunk_spans, merge_chunks
+from ocr import ocr_params
+
+CHUNKERS = ("structured", "fixed")
+DEDUP_MODES = ("near", "exact", "off")
+TABLE_FORMAT = 1  # Bump when the text of table row groups changes
+
+def chunking_params():
+    """Everything that changes the chunks of a file; part of the embedding cache key."""
+    params = {"chunker": CHUNKER, "strip_headers": STRIP_HEADERS, "dedup": DEDUP, "table_format": TABLE_FORMAT,
+              "ocr": ocr_params()}
+    if CHUNKER == "fixed":
+        params.update(chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+    else:
+        params.update(chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+    if DEDUP == "near":
+        params["dedup_max_distance"] = DEDUP_MAX_DISTANCE
+    return params
+
+def join_chunks(chunks):
+    """Rebuild the text of consecutive chunks, keeping their overlap once."""
+    if CHUNKER == "fixed":
+        return merge_chunks(chunks, overlap=CHUNK_OVERLAP)
+    text = chunks[0] if chunks else ""
+    for chunk in chunks[1:]:
+        # Structured chunks overlap by whole sentences, so the shared text has to be found
+        joined = join_overlapping(text, chunk)
+        text = joined if len(joined) < len(text) + len(chunk) else text + " " + chunk
+    return text
+
+# ---------------- Running headers & footers ----------------
+
+BOUNDARY_LINES = 3  # Lines at the top and bottom of a page checked for headers/footers
+HEADER_SAMPLE_PAGES = 30
+HEADER_MIN_RATIO = 0.5  # Share of sampled pages a line must repeat on
+HEADER_MIN_PAGES = 3
+_NUMBER = re.compile(r"\d+")
+
+def _line_keys(line):
+    # "Page 3 of 10" and "Page 4 of 10" are the same footer; lines with many numbers
+    # are more likely content (table rows, codes) and must repeat verbatim
+    line = " ".join(line.lower().split())
+    if len(_NUMBER.findall(line)) <= 2:
+        return {line, _NUMBER.sub("#", line)}
+    return {line}
+
+def _boundary_lines(page):
+    lines = page.splitlines(keepends=True)
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    top = filled[:BOUNDARY_LINES]
+    bottom = [i for i in filled[-BOUNDARY_LINES:] if i not in top]
+    return lines, [("top", i) for i in top] + [("bottom", i) for i in bottom]
+
+def strip_running_lines(pages, stats=None, sample_pages=HEADER_SAMPLE_PAGES):
+    """Yield pages without the header/footer lines that repeat across the first sample_pages pages.
+
+    Only the first and last BOUNDARY_LINES non-empty lines of a page are candidates,
+    so repeated body text is left alone.
+    """
+    pages = iter(pages)
+    sample = list(islice(pages, sample_pages))
+    counts = Counter()
+    for page in sample:
+        lines, boundary = _boundary_lines(page)
+        counts.update({(where, key) for where, i in boundary for key in _line_keys(lines[i])})
+    threshold = max(HEADER_MIN_PAGES, HEADER_MIN_RATIO * len(sample))
+    running = {key for key, count in counts.items() if count >= threshold and key[1]}
+
+    for page in chain(sample, pages):
+        if not running:
+            yield page
+            continue
+        lines, boundary = _boundary_lines(page)
+        drop = {i for where, i in boundary if any((where, key) in running for key in _line_keys(lines[i]))}
+        if stats is not None:
+            stats["boilerplate_lines"] = stats.get("boilerplate_lines", 0) + len(drop)
+        yield "".join(line for i, line in enumerate(lines) if i not in drop)
+
+# ---------------- Structured chunking ----------------
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*\s+")
+_LINE_END = re.compile(r"\n")
+_CELL_GAP = re.compile(r"\t| {2,}|\|")
+
+def _is_table(paragraph):
+    lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+    return len(lines) >= 2 and sum(bool(_CELL_GAP.search(line)) for line in lines) >= 0.8 * len(lines)
+
+def _hard_split(text, lo, hi, max_chars):
+    # A sentence longer than a chunk is cut at the last space that fits
+    while hi - lo > max_chars:
+        cut = max(text.rfind(" ", lo + 1, lo + max_chars), text.rfind("\n", lo + 1, lo + max_chars))
+        cut = cut + 1 if cut > lo else lo + max_chars
+        yield lo, cut
+        lo = cut
+    yield lo, hi
+
+def split_units(text, max_chars):
+    """Split text into contiguous (start, end, starts_paragraph) spans ending at sentence or
+    table-row boundaries, none longer than max_chars."""
+    units = []
+    pos = 0
+    for match in chain(_PARAGRAPH_BREAK.finditer(text), [None]):
+        end = match.end() if match else len(text)
+        if end <= pos:
+            continue
+        paragraph = text[pos:end]
+        pattern = _LINE_END if _is_table(paragraph) else _SENTENCE_END
+        first = True
+        prev = 0
+        for cut in chain((m.end() for m in pattern.finditer(paragraph)), [len(paragraph)]):
+            if cut <= prev:
+                continue
+            for lo, hi in _hard_split(paragraph, prev, cut, max_chars):
+                units.append((pos + lo, pos + hi, first))
+                first = False
+            prev = cut
+        pos = end
+    return units
+
+def iter_structured_spans(segments, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, paged=False):
+    """Yield (chunk, character offset, segment index) packing whole sentences up to max_tokens.
+
+    Consecutive chunks share up to overlap_tokens of trailing sentences. A new
+    paragraph starts a new chunk once the current one is three quarters full, and
+    with paged=True (segments are PDF pages) so does a new page.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    pending = deque()  # (offset, text, segment index) of the chunk being built
+    state = {"size": 0, "carried": 0}  # carried: leading units of pending already emitted as overlap
+
+    def flush(keep_overlap):
+        nonlocal pending
+        if len(pending) > state["carried"]:
+            text = "".join(unit[1] for unit in pending)
+            body = text.lstrip()
+            if body.strip():
+                yield body.rstrip(), pending[0][0] + len(text) - len(body), pending[0][2]
+        kept = deque()
+        kept_size = 0
+        for unit in reversed(pending if keep_overlap else ()):
+            if kept_size + len(unit[1]) > overlap_chars or len(kept) + 1 >= len(pending):
+                break
+            kept.appendleft(unit)
+            kept_size += len(unit[1])
+        pending = kept
+        state["size"], state["carried"] = kept_size, len(kept)
+
+    def push(unit, starts_paragraph):
+        size = state["size"]
+        if pending and (size + len(unit[1]) > max_chars or (starts_paragraph and size >= max_chars * 3 // 4)):
+            # Overlap only repeats sentences; it never fills a chunk on its own
+            yield from flush(keep_overlap=len(pending) > state["carried"])
+        if pending or unit[1].strip():
+            pending.append(unit)
+            state["size"] += len(unit[1])
+
+    rest = None  # (offset, text, segment index, starts paragraph) of a non-page segment's last unit,
+    offset = 0   # which the next segment may continue
+    for index, segment in enumerate(segments):
+        prev = None if paged else rest
+        text = (prev[1] if prev else "") + segment
+        text_offset = prev[0] if prev else offset
+        offset += len(segment)
+        units = split_units(text, max_chars)
+        if prev:
+            units = [(lo, hi, prev[3] if lo == 0 else starts) for lo, hi, starts in units]
+        if not paged and units:
+            lo, hi, starts = units.pop()
+            rest = (text_offset + lo, text[lo:hi], prev[2] if prev and lo < len(prev[1]) else index, starts)
+        for lo, hi, starts_paragraph in units:
+            unit_index = prev[2] if prev and lo < len(prev[1]) else index
+            yield from push((text_offset + lo, text[lo:hi], unit_index), starts_paragraph)
+        if paged and state["size"] >= max_chars // 2:
+            # Page breaks are natural boundaries unless they would leave a fragment
+            yield from flush(keep_overlap=False)
+    if rest:
+        yield from push(rest[:3], rest[3])
+    yield from flush(keep_overlap=False)
+
+# ---------------- Duplicate removal ----------------
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 6  # A hash within BANDS - 1 bits of another matches it exactly in at least one band
+SHINGLE_WORDS = 3
+_WORD = re.compile(r"\w+")
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "little")
+
+def simhash(words):
+    """64-bit SimHash over word shingles: similar texts get hashes differing in few bits."""
+    shingles = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    hashes = np.array([_hash64(s) for s in shingles], dtype="uint64")
+    bits = np.unpackbits(hashes.view("uint8").reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+class Deduplicator:
+    """Recognises chunks repeating an earlier one verbatim or, with max_distance set,
+    nearly (SimHashes at most max_distance bits apart)."""
+
+    def __init__(self, max_distance=None):
+        if max_distance is not None and not 0 <= max_distance < SIMHASH_BANDS:
+            raise ValueError(f"max_distance must be between 0 and {SIMHASH_BANDS - 1}")
+        self.max_distance = max_distance
+        self.exact = set()
+        self.bands = [{} for _ in range(SIMHASH_BANDS)]  # band value -> SimHashes having it
+
+    def _band_values(self, fingerprint):
+        edges = [round(i * SIMHASH_BITS / SIMHASH_BANDS) for i in range(SIMHASH_BANDS + 1)]
+        return [(fingerprint >> lo) & ((1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+
+    def check(self, text):
+        """Return "exact" or "near" for a duplicate, else None and remember text."""
+        words = _WORD.findall(text.lower())
+        key = _hash64(" ".join(words))
+        if key in self.exact:
+            return "exact"
+        self.exact.add(key)
+        if self.max_distance is None or len(words) < SHINGLE_WORDS:
+            return None
+        fingerprint = simhash(words)
+        values = self._band_values(fingerprint)
+        for band, value in zip(self.bands, values):
+            for other in band.get(value, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return "near"
+        for band, value in zip(self.bands, values):
+            band.setdefault(value, []).append(fingerprint)
+        return None
+
+# ---------------- Pipeline ----------------
+
+def iter_document_chunks(segments, paged=False, stats=None, chunker=CHUNKER, strip_headers=STRIP_HEADERS,
+                         dedup=DEDUP):
+    """Yield (chunk, character offset, segment index) for a document, ready to embed.
+
+    Running headers/footers are removed from pages (paged=True), the text is
+    chunked and repeated chunks are dropped. Offsets refer to the text after
+    header removal. stats, if given, is a dict that receives the counts
+    "chunks" (before removal), "exact_duplicates", "near_duplicates" and
+    "boilerplate_lines".
+    """
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {chunker}")
+    if dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode: {dedup}")
+    stats = {} if stats is None else stats
+    for name in ("chunks", "exact_duplicates", "near_duplicates", "boilerplate_lines"):
+        stats.setdefault(name, 0)
+
+    if paged and strip_headers:
+        segments = strip_running_lines(segments, stats)
+    if chunker == "fixed":
+        spans = iter_chunk_spans(segments, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+    else:
+        spans = iter_structured_spans(segments, paged=paged)
+    seen = None if dedup == "off" else Deduplicator(DEDUP_MAX_DISTANCE if dedup == "near" else None)
+    for span in spans:
+        stats["chunks"] += 1
+        duplicate = seen.check(span[0]) if seen else None
+        if duplicate:
+            stats[f"{duplicate}_duplicates"] += 1
+            continue
+        yield span
+
+def iter_table_chunks(lines, stats=None, chunker=CHUNKER, dedup=DEDUP):
+    """Yield (chunk, character offset, first data row) row groups of a table, ready to embed.
+
+    lines is the header line followed by one line per row (see
+    pdf_parser.iter_table_rows); offsets refer to their newline-joined text and
+    rows are 0-based. Each chunk is the header plus as many whole rows as fit
+    the chunk size, so rows are never split and every chunk names its columns.
+    Only verbatim duplicates are dropped: rows of one table look alike, and a
+    sign or a decimal point matters, so neither SimHash nor the word-level exact
+    match is safe here. stats receives the same counts as iter_document_chunks.
+    """
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker: {chunker}")
+    if dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode: {dedup}")
+    stats = {} if stats is None else stats
+    for name in ("chunks", "exact_duplicates", "near_duplicates", "boilerplate_lines"):
+        stats.setdefault(name, 0)
+    max_chars = CHUNK_SIZE if chunker == "fixed" else CHUNK_TOKENS * CHARS_PER_TOKEN
+    seen = None if dedup == "off" else set()
+
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    group = []  # Rows of the chunk being built
+    size = len(header)
+    first_row = 0
+    first_offset = offset = len(header) + 1
+
+    def emit():
+        chunk = header + "\n" + "\n".join(group)
+        stats["chunks"] += 1
+        if seen is not None:
+            key = _hash64(chunk)
+            if key in seen:
+                stats["exact_duplicates"] += 1
+                return ()
+            seen.add(key)
+        return ((chunk, first_offset, first_row),)
+
+    for row, line in enumerate(lines):
+        if group and size + 1 + len(line) > max_chars:
+            yield from emit()
+            group = []
+            size = len(header)
+            first_row, first_offset = row, offset
+        group.append(line)
+        size += 1 + len(line)
+        offset += len(line) + 1
+    if group:
+        yield from emit()
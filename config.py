@@ -0,0 +1,123 @@
+import os
+
+# Where persisted indexes and embedding caches live
+CACHE_DIR = os.environ.get("PDFQA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".pdfqa_cache"))
+INDEX_DIR = os.path.join(CACHE_DIR, "index")
+EMBED_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+
+# Chunking parameters (part of the embedding cache key)
+CHUNK_SIZE = int(os.environ.get("PDFQA_CHUNK_SIZE", 500))
+CHUNK_OVERLAP = int(os.environ.get("PDFQA_CHUNK_OVERLAP", 50))
+# "structured" packs whole sentences/table rows up to CHUNK_TOKENS, breaking at paragraphs
+# and pages; "fixed" slices CHUNK_SIZE-character windows with CHUNK_OVERLAP
+CHUNKER = os.environ.get("PDFQA_CHUNKER", "structured")
+CHUNK_TOKENS = int(os.environ.get("PDFQA_CHUNK_TOKENS", 128))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("PDFQA_CHUNK_OVERLAP_TOKENS", 16))
+# Drop running headers/footers repeated across PDF pages, and duplicate chunks
+# within a document before embedding: "near" (SimHash), "exact" or "off"
+STRIP_HEADERS = os.environ.get("PDFQA_STRIP_HEADERS", "1") == "1"
+DEDUP = os.environ.get("PDFQA_DEDUP", "near")
+DEDUP_MAX_DISTANCE = int(os.environ.get("PDFQA_DEDUP_MAX_DISTANCE", 5))  # SimHash bits, at most 5
+
+# Vector index: "auto" picks flat/hnsw/ivf/ivfpq from the corpus size
+INDEX_TYPE = os.environ.get("PDFQA_INDEX_TYPE", "auto")
+NPROBE = int(os.environ.get("PDFQA_NPROBE", 16))
+EF_SEARCH = int(os.environ.get("PDFQA_EF_SEARCH", 64))
+# Stored vector precision: "float32", "float16" or "int8" (see the README for the recall cost)
+VECTOR_PRECISION = os.environ.get("PDFQA_VECTOR_PRECISION", "float16")
+
+# Streaming ingestion: chunks per pipeline batch and batches buffered ahead of the encoder
+EMBED_BATCH_SIZE = int(os.environ.get("PDFQA_EMBED_BATCH_SIZE", 256))
+INGEST_QUEUE_DEPTH = int(os.environ.get("PDFQA_INGEST_QUEUE_DEPTH", 2))
+
+# Embedding backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime on CPU, from a
+# model written by `python export_onnx.py --quantize`; int8 unless PDFQA_ONNX_QUANTIZED=0)
+EMBED_BACKEND = os.environ.get("PDFQA_EMBED_BACKEND", "torch")
+ONNX_DIR = os.path.join(CACHE_DIR, "onnx")
+ONNX_QUANTIZED = os.environ.get("PDFQA_ONNX_QUANTIZED", "1") == "1"
+ONNX_THREADS = int(os.environ.get("PDFQA_ONNX_THREADS", 0))  # 0 = one per physical core
+
+# Embedder: model batch size within a length-sorted pipeline batch, and query LRU size
+ENCODE_BATCH_SIZE = int(os.environ.get("PDFQA_ENCODE_BATCH_SIZE", 32))
+QUERY_CACHE_SIZE = int(os.environ.get("PDFQA_QUERY_CACHE_SIZE", 1024))
+
+# CSV/TSV files are parsed this many rows at a time and chunked in row groups
+TABLE_BATCH_ROWS = int(os.environ.get("PDFQA_TABLE_BATCH_ROWS", 10000))
+
+# OCR of PDF pages that have images but no usable text layer (fewer than OCR_MIN_CHARS
+# letters/digits): Tesseract language(s), render resolution and worker processes
+OCR = os.environ.get("PDFQA_OCR", "1") == "1"
+OCR_LANGUAGE = os.environ.get("PDFQA_OCR_LANGUAGE", "eng")
+OCR_DPI = int(os.environ.get("PDFQA_OCR_DPI", 300))
+OCR_MIN_CHARS = int(os.environ.get("PDFQA_OCR_MIN_CHARS", 20))
+OCR_WORKERS = int(os.environ.get("PDFQA_OCR_WORKERS", os.cpu_count() or 1))
+OCR_CACHE_DIR = os.path.join(CACHE_DIR, "ocr")
+
+# Parallel extraction: worker processes, and page-range size for splitting large PDFs
+EXTRACT_WORKERS = int(os.environ.get("PDFQA_EXTRACT_WORKERS", os.cpu_count() or 1))
+PDF_SPLIT_PAGES = int(os.environ.get("PDFQA_PDF_SPLIT_PAGES", 200))
+
+# Ollama model used for answers, summaries and follow-ups, and the server to call
+# (point it at benchmarks/ollama_stub.py to test without a model)
+LLM_MODEL = os.environ.get("PDFQA_LLM_MODEL", "mistral")
+OLLAMA_URL = os.environ.get("PDFQA_OLLAMA_URL", os.environ.get("OLLAMA_HOST", "http://localhost:11434"))
+
+# Server address; same variables Gradio itself honours
+SERVER_HOST = os.environ.get("GRADIO_SERVER_NAME", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("GRADIO_SERVER_PORT", 7860))
+
+# Retrieval mode used by the chat: "dense", "sparse" (BM25) or "hybrid" (reciprocal rank fusion)
+SEARCH_MODE = os.environ.get("PDFQA_SEARCH_MODE", "hybrid")
+
+# Context packing: chunks retrieved per question, prompt budget, near-duplicate cut-off and
+# optional MMR diversification (unset = off; 1.0 = pure relevance)
+RETRIEVE_TOP_K = int(os.environ.get("PDFQA_RETRIEVE_TOP_K", 6))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("PDFQA_CONTEXT_TOKEN_BUDGET", 768))
+DUPLICATE_THRESHOLD = float(os.environ.get("PDFQA_DUPLICATE_THRESHOLD", 0.8))
+MMR_LAMBDA = float(os.environ["PDFQA_MMR_LAMBDA"]) if os.environ.get("PDFQA_MMR_LAMBDA") else None
+
+# On-demand cProfile dumps (POST /debug/profile arms the next request); the route only
+# exists with PDFQA_PROFILE_ENDPOINT=1, since it is unauthenticated
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+PROFILE_ENDPOINT = os.environ.get("PDFQA_PROFILE_ENDPOINT", "0") == "1"
+
+# PDF previews: first-page thumbnails rendered in the background, cached by file hash
+PREVIEW_DIR = os.path.join(CACHE_DIR, "previews")
+PREVIEW_DPI = int(os.environ.get("PDFQA_PREVIEW_DPI", 50))
+PREVIEW_WORKERS = int(os.environ.get("PDFQA_PREVIEW_WORKERS", 2))
+
+# Semantic answer cache: cosine threshold for reusing an answer, size, TTL and persistence
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("PDFQA_ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_SIZE = int(os.environ.get("PDFQA_ANSWER_CACHE_SIZE", 256))
+ANSWER_CACHE_TTL = float(os.environ.get("PDFQA_ANSWER_CACHE_TTL", 24 * 3600))
+ANSWER_CACHE_PATH = (
+    os.path.join(CACHE_DIR, "answers.jsonl") if os.environ.get("PDFQA_ANSWER_CACHE_PERSIST", "1") == "1" else None
+)
+
+# Background summarization: concurrent LLM calls, section size for the map step,
+# cap on sections per document and summaries combined per reduce call
+SUMMARY_CACHE_DIR = os.path.join(CACHE_DIR, "summaries")
+SUMMARY_CONCURRENCY = int(os.environ.get("PDFQA_SUMMARY_CONCURRENCY", 2))
+SUMMARY_SECTION_CHARS = int(os.environ.get("PDFQA_SUMMARY_SECTION_CHARS", 6000))
+SUMMARY_MAX_SECTIONS = int(os.environ.get("PDFQA_SUMMARY_MAX_SECTIONS", 16))
+SUMMARY_REDUCE_FANIN = int(os.environ.get("PDFQA_SUMMARY_REDUCE_FANIN", 8))
+
+# Conversation memory: sessions kept (least recently used evicted first), idle time before a
+# session is dropped, history token cap per session and what happens to older turns:
+# "window" drops them, "summary" folds them into a rolling summary (one extra LLM call)
+MEMORY_MAX_SESSIONS = int(os.environ.get("PDFQA_MEMORY_MAX_SESSIONS", 100))
+MEMORY_IDLE_TTL = float(os.environ.get("PDFQA_MEMORY_IDLE_TTL", 3600))
+MEMORY_MAX_TOKENS = int(os.environ.get("PDFQA_MEMORY_MAX_TOKENS", 1000))
+MEMORY_MODE = os.environ.get("PDFQA_MEMORY_MODE", "window")
+
+# Serving: chats answered in parallel (Ollama itself also needs OLLAMA_NUM_PARALLEL >= this),
+# and whether each browser session gets its own document collection instead of one shared index
+CHAT_CONCURRENCY = int(os.environ.get("PDFQA_CHAT_CONCURRENCY", 4))
+PER_SESSION_DOCS = os.environ.get("PDFQA_PER_SESSION_DOCS", "0") == "1"
+
+# LLM scheduler: calls sent to Ollama at once (set OLLAMA_NUM_PARALLEL to match), how many of
+# them background summaries may hold, and seconds a call may spend queued plus generating
+LLM_CONCURRENCY = int(os.environ.get("PDFQA_LLM_CONCURRENCY", CHAT_CONCURRENCY))
+LLM_BACKGROUND_SLOTS = int(os.environ.get("PDFQA_LLM_BACKGROUND_SLOTS", max(1, LLM_CONCURRENCY - 1)))
+LLM_TIMEOUT = float(os.environ.get("PDFQA_LLM_TIMEOUT", 120))
+LLM_BACKGROUND_TIMEOUT = float(os.environ.get("PDFQA_LLM_BACKGROUND_TIMEOUT", 1800))
@@ -0,0 +1,145 @@
+import re
+import numpy as np
+
+from config import CONTEXT_TOKEN_BUDGET, MMR_LAMBDA, DUPLICATE_THRESHOLD
+from chunk_store import is_table
+import metrics
+
+CHARS_PER_TOKEN = 4  # Rough average for English text with LLaMA/Mistral-style tokenizers
+MAX_OVERLAP_CHARS = 200
+SHINGLE_SIZE = 3
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def join_overlapping(left, right, max_overlap=MAX_OVERLAP_CHARS):
+    # Adjacent chunks repeat the tail of the previous one; keep that text once
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + right
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def mmr_order(ids, vectors, query_embedding, mmr_lambda):
+    """Maximal marginal relevance: trade query similarity against similarity to already picked chunks."""
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype="float32")
+    query = query / max(np.linalg.norm(query), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    picked = []
+    remaining = list(range(len(ids)))
+    while remaining:
+        if picked:
+            redundancy = similarity[np.ix_(remaining, picked)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        picked.append(remaining.pop(int(np.argmax(scores))))
+    return [ids[i] for i in picked]
+
+def _merge_adjacent(retriever, ids):
+    # Runs of consecutive chunk IDs from one document are neighbouring windows of its text
+    rank = {chunk_id: r for r, chunk_id in enumerate(ids)}
+    passages = []
+    run = []
+    for chunk_id in sorted(ids):
+        if run and chunk_id == run[-1] + 1 and retriever.document_of(chunk_id) == retriever.document_of(run[-1]):
+            run.append(chunk_id)
+            continue
+        if run:
+            passages.append(run)
+        run = [chunk_id]
+    if run:
+        passages.append(run)
+    passages.sort(key=lambda members: min(rank[i] for i in members))
+
+    from chunker import join_chunks  # chunker imports this module
+
+    merged = []
+    for members in passages:
+        doc_id = retriever.document_of(members[0])
+        texts = [retriever.chunk_store[chunk_id] for chunk_id in members]
+        if is_table(doc_id):
+            # Row groups don't overlap but each repeats the header line
+            text = "\n".join([texts[0]] + [following.partition("\n")[2] for following in texts[1:]])
+        else:
+            # Keeps an overlap once and puts a space between neighbours that don't overlap
+            text = join_chunks(texts)
+        source = (doc_id, retriever.span_of(members[0])[0], retriever.span_of(members[-1])[1])
+        merged.append((text, source))
+    return merged
+
+def format_source(source):
+    """"report.pdf p. 3-4" style label for a (doc ID, first page, last page) source.
+
+    For tables the numbers are data rows: "sales.csv rows 41-60".
+    """
+    doc_id, first, last = source
+    label = doc_id or "unknown"
+    if first is None:
+        return label
+    if is_table(doc_id):
+        return f"{label} row {first}" if first == last else f"{label} rows {first}-{last}"
+    return f"{label} p. {first}" if first == last else f"{label} p. {first}-{last}"
+
+@metrics.timed("context")
+def build_context(retriever, ids, token_budget=CONTEXT_TOKEN_BUDGET, query_embedding=None,
+                  mmr_lambda=MMR_LAMBDA, duplicate_threshold=DUPLICATE_THRESHOLD):
+    """Turn retrieved chunk IDs into prompt passages that fit token_budget.
+
+    Returns (passages, stats); stats["sources"] holds a (doc ID, first page, last
+    page) per passage (data rows for tables), pages being None for formats without them. Passages keep retrieval order; overlapping neighbours
+    are merged, near-duplicates dropped and, with mmr_lambda set, candidates are
+    diversified using the vectors already stored in the index.
+    """
+    ids = list(dict.fromkeys(ids))
+    retrieved_tokens = sum(estimate_tokens(retriever.chunk_store[i]) for i in ids)
+    if mmr_lambda is not None and query_embedding is not None and len(ids) > 1:
+        ids = mmr_order(ids, retriever.get_vectors(ids), query_embedding, mmr_lambda)
+
+    merged = _merge_adjacent(retriever, ids)
+
+    unique = []
+    kept_shingles = []
+    for text, source in merged:
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, other) >= duplicate_threshold for other in kept_shingles):
+            continue
+        unique.append((text, source))
+        kept_shingles.append(shingles)
+
+    passages = []
+    sources = []
+    used = 0
+    for text, source in unique:
+        tokens = estimate_tokens(text)
+        if used + tokens <= token_budget:
+            passages.append(text)
+            sources.append(source)
+            used += tokens
+        elif not passages:
+            # Never send an empty context: trim the best passage to the budget
+            passages.append(text[:token_budget * CHARS_PER_TOKEN])
+            sources.append(source)
+            used = estimate_tokens(passages[0])
+
+    stats = {
+        "retrieved_chunks": len(ids),
+        "passages": len(passages),
+        "merged_chunks": len(ids) - len(merged),
+        "duplicates_dropped": len(merged) - len(unique),
+        "dropped_for_budget": len(unique) - len(passages),
+        "retrieved_tokens": retrieved_tokens,
+        "context_tokens": used,
+        "sources": sources,
+    }
+    return passages, stats
@@ -1,9 +1,131 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import os
+import threading
+from collections import OrderedDict
 
-# Load model once globally (fastest small one)
-model = SentenceTransformer('all-MiniLM-L6-v2')
+from config import ENCODE_BATCH_SIZE, QUERY_CACHE_SIZE, EMBED_BACKEND, ONNX_DIR, ONNX_QUANTIZED, ONNX_THREADS
+import metrics
 
-def get_embeddings(chunks):
-    embeddings = model.encode(chunks)
+MODEL_NAME = 'all-MiniLM-L6-v2'
+BACKENDS = ("torch", "onnx")
+
+_model = None  # Loaded on first use (or by warmup) to keep startup fast
+_model_lock = threading.Lock()
+
+_query_cache = OrderedDict()  # normalised query -> embedding, least recently used first
+_lock = threading.Lock()
+_stats = {"corpus_chunks": 0, "corpus_seconds": 0.0, "query_hits": 0, "query_misses": 0}
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
+    return _model
+
+def load_model(backend=EMBED_BACKEND):
+    # Both backends give vectors for the same model, so indexes and caches are shared
+    if backend == "onnx":
+        from onnx_embedder import OnnxEncoder  # onnxruntime only, no torch
+        return OnnxEncoder.load(os.path.join(ONNX_DIR, MODEL_NAME), quantized=ONNX_QUANTIZED, threads=ONNX_THREADS)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer  # Pulls in torch; import lazily
+        return SentenceTransformer(MODEL_NAME)  # Fastest small one
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+def warmup():
+    get_model()
+
+def _normalise(text):
+    # The model is uncased, so case and whitespace differences don't change the embedding
+    return " ".join(text.split()).lower()
+
+def _unit(vectors):
+    # Unit length, so inner product equals cosine similarity
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype("float32")
+
+def embed_corpus(chunks, batch_size=ENCODE_BATCH_SIZE):
+    """Encode document chunks to unit vectors, batching similar lengths together to minimise padding."""
+    if not len(chunks):
+        return np.zeros((0, embedding_dim()), dtype="float32")
+    order = np.argsort([len(c) for c in chunks], kind="stable")
+    embeddings = np.empty((len(chunks), embedding_dim()), dtype="float32")
+    with metrics.span("embed") as span:
+        for i in range(0, len(order), batch_size):
+            bucket = order[i:i + batch_size]
+            embeddings[bucket] = _unit(get_model().encode([chunks[j] for j in bucket], batch_size=batch_size))
+    with _lock:
+        _stats["corpus_chunks"] += len(chunks)
+        _stats["corpus_seconds"] += span.seconds
     return embeddings
+
+def embed_query(text):
+    """Encode a user question, serving repeats from a bounded LRU cache."""
+    key = _normalise(text)
+    with _lock:
+        cached = _query_cache.get(key)
+        if cached is not None:
+            _query_cache.move_to_end(key)
+            _stats["query_hits"] += 1
+            return cached.copy()
+        _stats["query_misses"] += 1
+
+    with metrics.span("embed_query"):
+        embedding = _unit(np.asarray(get_model().encode([key])[0], dtype="float32"))
+    if QUERY_CACHE_SIZE > 0:
+        with _lock:
+            _query_cache[key] = embedding
+            _query_cache.move_to_end(key)
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+    return embedding.copy()
+
+def embed_queries(texts, batch_size=ENCODE_BATCH_SIZE):
+    """Encode many questions at once; cached ones are reused and the rest go through embed_corpus."""
+    keys = [_normalise(text) for text in texts]
+    embeddings = np.empty((len(keys), embedding_dim()), dtype="float32")
+    missing = {}  # normalised query -> rows needing it
+    with _lock:
+        for row, key in enumerate(keys):
+            cached = _query_cache.get(key)
+            if cached is not None:
+                _query_cache.move_to_end(key)
+                embeddings[row] = cached
+            else:
+                missing.setdefault(key, []).append(row)
+        _stats["query_hits"] += len(keys) - sum(len(rows) for rows in missing.values())
+        _stats["query_misses"] += sum(len(rows) for rows in missing.values())
+
+    if missing:
+        fresh = embed_corpus(list(missing), batch_size=batch_size)
+        for rows, embedding in zip(missing.values(), fresh):
+            embeddings[rows] = embedding
+        if QUERY_CACHE_SIZE > 0:
+            with _lock:
+                for key, embedding in zip(missing, fresh):
+                    _query_cache[key] = embedding
+                    _query_cache.move_to_end(key)
+                while len(_query_cache) > QUERY_CACHE_SIZE:
+                    _query_cache.popitem(last=False)
+    return embeddings
+
+def get_embeddings(chunks, batch_size=ENCODE_BATCH_SIZE):
+    return embed_corpus(chunks, batch_size=batch_size)
+
+def embedding_dim():
+    return get_model().get_sentence_embedding_dimension()
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["query_cache_size"] = len(_query_cache)
+    lookups = stats["query_hits"] + stats["query_misses"]
+    stats["query_hit_rate"] = stats["query_hits"] / lookups if lookups else 0.0
+    stats["chunks_per_sec"] = stats["corpus_chunks"] / stats["corpus_seconds"] if stats["corpus_seconds"] else 0.0
+    return stats
+
+def clear_query_cache():
+    with _lock:
+        _query_cache.clear()
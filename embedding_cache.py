@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+from config import EMBED_CACHE_DIR
+
+# Bump when the on-disk layout changes so stale entries are ignored
+CACHE_VERSION = 3
+
+def file_hash(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def cache_key(content_hash, model_name, chunking):
+    """chunking: the chunker settings, see chunker.chunking_params()."""
+    params = {
+        "version": CACHE_VERSION,
+        "content": content_hash,
+        "model": model_name,
+        "chunking": chunking,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _entry_dir(key, cache_dir=EMBED_CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], key)
+
+def _read_meta(entry):
+    try:
+        with open(os.path.join(entry, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def contains(key, cache_dir=EMBED_CACHE_DIR):
+    return _read_meta(_entry_dir(key, cache_dir)) is not None
+
+def load_chunks(key, limit=None, cache_dir=EMBED_CACHE_DIR):
+    entry = _entry_dir(key, cache_dir)
+    chunks = []
+    try:
+        with open(os.path.join(entry, "chunks.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                if limit is not None and len(chunks) >= limit:
+                    break
+                chunks.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return chunks
+
+def iter_batches(key, batch_size, cache_dir=EMBED_CACHE_DIR):
+    """Yield (chunks, embeddings, positions) batches without loading the whole entry.
+
+    positions has one (character offset, segment index) row per chunk, see CacheWriter.append.
+    """
+    entry = _entry_dir(key, cache_dir)
+    meta = _read_meta(entry)
+    if meta is None or not meta["count"]:
+        return
+    vectors = np.memmap(os.path.join(entry, "embeddings.f32"), dtype="float32", mode="r",
+                        shape=(meta["count"], meta["dim"]))
+    positions = np.memmap(os.path.join(entry, "positions.i64"), dtype="int64", mode="r",
+                          shape=(meta["count"], 2))
+    start = 0
+    batch = []
+
+    def emit():
+        end = start + len(batch)
+        return batch, np.array(vectors[start:end]), np.array(positions[start:end])
+
+    with open(os.path.join(entry, "chunks.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) == batch_size:
+                yield emit()
+                start += len(batch)
+                batch = []
+    if batch:
+        yield emit()
+
+class CacheWriter:
+    """Appends chunk/embedding batches to a cache entry; visible to readers only after commit()."""
+
+    def __init__(self, key, cache_dir=EMBED_CACHE_DIR):
+        self.entry = _entry_dir(key, cache_dir)
+        self.tmp = self.entry + ".tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.chunks_file = open(os.path.join(self.tmp, "chunks.jsonl"), "w", encoding="utf-8")
+        self.vectors_file = open(os.path.join(self.tmp, "embeddings.f32"), "wb")
+        self.positions_file = open(os.path.join(self.tmp, "positions.i64"), "wb")
+        self.count = 0
+        self.dim = None
+
+    def append(self, chunks, embeddings, positions=None):
+        """positions: per chunk (character offset in the document, index of the segment/page it starts in)."""
+        embeddings = np.asarray(embeddings, dtype="float32")
+        if len(chunks):
+            self.dim = embeddings.shape[1]
+        if positions is None:
+            positions = np.full((len(chunks), 2), -1, dtype="int64")
+        for chunk in chunks:
+            self.chunks_file.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        self.vectors_file.write(embeddings.tobytes())
+        self.positions_file.write(np.asarray(positions, dtype="int64").reshape(-1, 2).tobytes())
+        self.count += len(chunks)
+
+    def _close(self):
+        self.chunks_file.close()
+        self.vectors_file.close()
+        self.positions_file.close()
+
+    def commit(self, dim=None):
+        self._close()
+        with open(os.path.join(self.tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": self.count, "dim": self.dim or dim or 0}, f)
+        shutil.rmtree(self.entry, ignore_errors=True)
+        os.replace(self.tmp, self.entry)
+
+    def abort(self):
+        self._close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
@@ -0,0 +1,125 @@
+"""Export the sentence-transformers embedder to ONNX (and int8) for PDFQA_EMBED_BACKEND=onnx.
+
+    python export_onnx.py --quantize
+    python export_onnx.py --model all-MiniLM-L6-v2 --out-dir /models/minilm --quantize
+
+Needs torch, sentence-transformers, onnx and onnxruntime once, at export time.
+Each exported variant is checked against the PyTorch embeddings of sample
+sentences. A variant with any cosine similarity below
+onnx_embedder.COSINE_TOLERANCE is deleted and the export fails. The measured
+values are kept in meta.json, and OnnxEncoder.load checks them again.
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+
+from config import ONNX_DIR
+from embedder import MODEL_NAME
+from onnx_embedder import OnnxEncoder, FP32_FILE, INT8_FILE, META_FILE, TOKENIZER_FILE, COSINE_TOLERANCE
+
+SAMPLE_SENTENCES = [
+    "What is the termination notice period in the service agreement?",
+    "Revenue for the third quarter rose 12% compared with the same period last year.",
+    "The pump must be inspected every 500 operating hours or every six months, whichever comes first.",
+    "order_id | date | customer | amount\n100231 | 2024-03-02 | C00412 | 1520.00",
+    "Page 3 of 10",
+    "Der Vertrag verlängert sich automatisch um ein weiteres Jahr.",
+    "Safety valves shall be rated for at least 1.1 times the maximum allowable working pressure, "
+    "and their discharge must be routed away from walkways, ladders and other areas where staff "
+    "may be present during normal operation or maintenance of the equipment. " * 4,
+    "",
+]
+
+def _unit(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def export(model_name, out_dir, quantize=False, opset=17):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    class MeanPooled(torch.nn.Module):
+        # Pooling inside the graph, so ONNX Runtime returns sentence embeddings directly
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids)[0]
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+    os.makedirs(out_dir, exist_ok=True)
+    sample = tokenizer(["export sample", "a slightly longer export sample"], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    # The TorchScript exporter handles dynamic_axes; newer torch defaults to the dynamo one
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            MeanPooled(transformer), tuple(sample[name] for name in names), fp32_path,
+            input_names=names, output_names=["sentence_embedding"],
+            dynamic_axes={**{name: {0: "batch", 1: "tokens"} for name in names}, "sentence_embedding": {0: "batch"}},
+            opset_version=opset, **kwargs,
+        )
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, TOKENIZER_FILE))
+
+    meta = {
+        "model": model_name,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_length": model.max_seq_length,
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+        "cosine": {},
+    }
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    variants = [("float32", FP32_FILE)]
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, os.path.join(out_dir, INT8_FILE), weight_type=QuantType.QInt8)
+        variants.append(("int8", INT8_FILE))
+
+    # Compare against the PyTorch path on the same texts
+    reference = _unit(model.encode(SAMPLE_SENTENCES, batch_size=len(SAMPLE_SENTENCES)))
+    failed = []
+    for variant, filename in variants:
+        encoder = OnnxEncoder(os.path.join(out_dir, filename), os.path.join(out_dir, TOKENIZER_FILE), meta)
+        cosine = np.sum(reference * _unit(encoder.encode(SAMPLE_SENTENCES)), axis=1)
+        meta["cosine"][variant] = {"min": round(float(cosine.min()), 6), "mean": round(float(cosine.mean()), 6)}
+        print(f"{variant:<8} cosine to PyTorch: min {cosine.min():.6f}, mean {cosine.mean():.6f} "
+              f"(tolerance {COSINE_TOLERANCE[variant]})")
+        if cosine.min() < COSINE_TOLERANCE[variant]:
+            failed.append(variant)
+            # Its vectors would mix into the index and the embedding cache, so it must not be loadable
+            os.remove(os.path.join(out_dir, filename))
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformers model name or path")
+    parser.add_argument("--out-dir", help=f"default: {ONNX_DIR}/<model name>")
+    parser.add_argument("--quantize", action="store_true", help="also write a dynamically quantized int8 model")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args(argv)
+
+    out_dir = args.out_dir or os.path.join(ONNX_DIR, os.path.basename(args.model.rstrip("/")))
+    failed = export(args.model, out_dir, quantize=args.quantize, opset=args.opset)
+    if failed:
+        sys.exit(f"Outside the cosine tolerance, removed: {', '.join(failed)}")
+    print(f"Exported to {out_dir}")
+
+if __name__ == "__main__":
+    main()
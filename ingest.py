@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import threading
+from itertools import islice
+import numpy as np
+
+from pdf_parser import iter_text_segments, iter_extracted_files, iter_table_rows
+from chunker import iter_document_chunks, iter_table_chunks
+from chunk_store import is_table
+from embedder import embed_corpus, get_stats
+from config import EMBED_BATCH_SIZE, INGEST_QUEUE_DEPTH, EXTRACT_WORKERS
+import embedding_cache
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+def document_id(path, content_hash):
+    """"1a2b3c4d/report.pdf": the file name under the start of its content hash.
+
+    Different files with the same name stay apart, the same file uploaded twice is
+    indexed once, and the ID still ends in the file's extension.
+    """
+    return f"{content_hash[:8]}/{os.path.basename(path)}"
+
+def iter_batches(items, batch_size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _produce(path, pages, batches, stop, batch_size, stats):
+    try:
+        # Pages are read lazily while chunking, so chunk time is the chunker's total minus parsing
+        if is_table(path):
+            # Tables stream row by row into row groups
+            rows = iter_table_rows(path) if pages is None else "".join(pages).split("\n")
+            segments = metrics.TimedIterator(rows)
+            chunks = metrics.TimedIterator(iter_table_chunks(segments, stats=stats))
+        else:
+            segments = metrics.TimedIterator(iter_text_segments(path) if pages is None else iter(pages))
+            paged = path.lower().endswith(".pdf")
+            chunks = metrics.TimedIterator(iter_document_chunks(segments, paged=paged, stats=stats))
+        try:
+            for batch in iter_batches(chunks, batch_size):
+                if stop.is_set():
+                    return
+                batches.put(batch)
+        finally:
+            if pages is None:
+                metrics.observe("pdfqa_stage_seconds", segments.seconds, stage="parse")
+            metrics.observe("pdfqa_stage_seconds", chunks.seconds - segments.seconds, stage="chunk")
+    except Exception as e:
+        batches.put(e)
+    finally:
+        batches.put(_DONE)
+
+def iter_embedded_batches(path, batch_size=EMBED_BATCH_SIZE, queue_depth=INGEST_QUEUE_DEPTH, pages=None, stats=None):
+    """Yield (chunks, embeddings, positions) batches for a file, or for its already extracted pages.
+
+    positions holds (character offset, segment index) per chunk; for PDFs segments are pages,
+    for tables the index is the chunk's first data row.
+    stats, if given, receives the chunker's counts (see chunker.iter_document_chunks).
+
+    Parsing and chunking run in a background thread feeding a bounded queue, so the
+    next pages are read while the current batch is being encoded, and at most
+    queue_depth + 1 batches are held in memory regardless of document size.
+    """
+    batches = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, args=(path, pages, batches, stop, batch_size, stats),
+                                daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            chunks = [chunk for chunk, _, _ in batch]
+            positions = np.array([(start, segment) for _, start, segment in batch], dtype="int64")
+            yield chunks, embed_corpus(chunks), positions
+    finally:
+        # Unblock and stop the producer if the consumer stopped early
+        stop.set()
+        while producer.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+def _add(retriever, doc_id, chunks, embeddings, positions, paged):
+    # Only PDF pages and table rows are kept; other formats keep character offsets alone
+    pages = positions[:, 1] if paged else None
+    retriever.add(embeddings, chunks, doc_id=doc_id, pages=pages, starts=positions[:, 0])
+
+def _report_chunking(doc_id, count, stats):
+    dropped = stats.get("exact_duplicates", 0) + stats.get("near_duplicates", 0)
+    speed = get_stats()["chunks_per_sec"]
+    saved_s = dropped / speed if speed else 0.0
+    for kind in ("exact", "near"):
+        metrics.inc("pdfqa_duplicate_chunks_total", stats.get(f"{kind}_duplicates", 0), kind=kind)
+    metrics.inc("pdfqa_boilerplate_lines_total", stats.get("boilerplate_lines", 0))
+    metrics.inc("pdfqa_embed_seconds_saved_total", saved_s)
+    if dropped or stats.get("boilerplate_lines"):
+        logger.info("%s: %d chunks embedded, %d duplicates skipped (%d exact, %d near; ~%.1fs of embedding), "
+                    "%d header/footer lines removed", doc_id, count, dropped, stats.get("exact_duplicates", 0),
+                    stats.get("near_duplicates", 0), saved_s, stats.get("boilerplate_lines", 0))
+
+def ingest_document(path, retriever, doc_id, key, batch_size=EMBED_BATCH_SIZE, pages=None):
+    """Stream a file into the retriever, reusing or filling the embedding cache entry for key.
+
+    pages: the file's already extracted text as a list of segments (see iter_extracted_files).
+    Returns the number of chunks indexed.
+    """
+    retriever.remove_document(doc_id)
+    retriever.add_document(doc_id, [], [])
+    paged = path.lower().endswith(".pdf") or is_table(path)
+    count = 0
+
+    if embedding_cache.contains(key):
+        for chunks, embeddings, positions in embedding_cache.iter_batches(key, batch_size):
+            _add(retriever, doc_id, chunks, embeddings, positions, paged)
+            count += len(chunks)
+    else:
+        writer = embedding_cache.CacheWriter(key)
+        stats = {}
+        try:
+            for chunks, embeddings, positions in iter_embedded_batches(path, batch_size=batch_size, pages=pages,
+                                                                       stats=stats):
+                _add(retriever, doc_id, chunks, embeddings, positions, paged)
+                writer.append(chunks, embeddings, positions)
+                count += len(chunks)
+        except BaseException:
+            writer.abort()
+            retriever.remove_document(doc_id)
+            raise
+        writer.commit(dim=retriever.dim)
+        _report_chunking(doc_id, count, stats)
+
+    retriever.set_document_version(doc_id, key)
+    metrics.inc("pdfqa_chunks_indexed_total", count)
+    return count
+
+def ingest_documents(docs, retriever, workers=EXTRACT_WORKERS, batch_size=EMBED_BATCH_SIZE):
+    """Ingest (path, doc_id, key) triples; returns ({doc_id: chunk count}, {doc_id: error}).
+
+    When several files need parsing they are extracted in a process pool and fed
+    to the encoder in input order; a single file keeps the page-streaming path,
+    and so do tables, which would otherwise be held in memory whole.
+    A failing file is reported and skipped rather than aborting the batch.
+    """
+    counts = {}
+    errors = {}
+
+    def ingest(path, doc_id, key, pages=None):
+        try:
+            counts[doc_id] = ingest_document(path, retriever, doc_id, key, batch_size=batch_size, pages=pages)
+        except Exception as e:
+            errors[doc_id] = e
+
+    # Files that need parsing (tables excepted) are extracted ahead in a process pool;
+    # every document is still indexed in input order
+    fresh = [doc for doc in docs if not embedding_cache.contains(doc[2]) and not is_table(doc[0])]
+    pooled = set(fresh) if workers > 1 and len(fresh) > 1 else set()
+    extracted = iter_extracted_files([path for path, _, _ in fresh], workers=workers, segments=True) if pooled else None
+    results = {}
+
+    def extracted_pages(path):
+        # Unsupported files are left out by the extractor; report them instead of waiting
+        while path not in results:
+            done, pages, error = next(extracted, (path, None, ValueError(f"Unsupported file type: {path}")))
+            results[done] = pages, error
+        return results.pop(path)
+
+    for path, doc_id, key in docs:
+        if (path, doc_id, key) not in pooled:
+            ingest(path, doc_id, key)
+            continue
+        pages, error = extracted_pages(path)
+        if error is not None:
+            errors[doc_id] = error
+        else:
+            ingest(path, doc_id, key, pages=pages)
+
+    stats = get_stats()
+    logger.info("Ingested %d chunks from %d documents; encoder at %.1f chunks/sec",
+                sum(counts.values()), len(counts), stats["chunks_per_sec"])
+    return counts, errors
@@ -0,0 +1,145 @@
+"""One queue for every LLM call: bounded concurrency, priority classes, timeouts and cancellation."""
+import itertools
+import threading
+import time
+
+from config import LLM_CONCURRENCY, LLM_BACKGROUND_SLOTS, LLM_TIMEOUT, LLM_BACKGROUND_TIMEOUT
+import metrics
+
+# Priority classes, most urgent first
+INTERACTIVE, FOLLOWUP, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "followup", "background")
+
+class LLMTimeout(TimeoutError):
+    pass
+
+class LLMCancelled(Exception):
+    pass
+
+class _Request:
+    def __init__(self, priority, seq, owner, deadline):
+        self.priority = priority
+        self.seq = seq
+        self.owner = owner
+        self.deadline = deadline
+        self.cancelled = False
+
+    def order(self):
+        return self.priority, self.seq
+
+class LLMScheduler:
+    """Grants at most `concurrency` LLM calls at once, most urgent class first, FIFO within a class.
+
+    Background calls may hold at most `background_slots` of them, so a burst of
+    summaries always leaves room for answers. A call's timeout covers its time in
+    the queue and its generation; cancel(owner) stops the owner's queued and
+    running calls. Running calls stop at their next token, so the HTTP client's
+    own timeout has to cover a model that never starts answering.
+    """
+
+    def __init__(self, concurrency=LLM_CONCURRENCY, background_slots=LLM_BACKGROUND_SLOTS,
+                 timeouts=(LLM_TIMEOUT, LLM_TIMEOUT, LLM_BACKGROUND_TIMEOUT)):
+        self.concurrency = max(1, concurrency)
+        self.background_slots = max(1, min(background_slots, self.concurrency))
+        self.timeouts = timeouts
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = []
+        self._seq = itertools.count()
+
+    def _startable(self, request):
+        if len(self._running) >= self.concurrency:
+            return False
+        if request.priority == BACKGROUND:
+            return sum(r.priority == BACKGROUND for r in self._running) < self.background_slots
+        return True
+
+    def _next(self):
+        # The most urgent waiting call that may start now; a blocked background call doesn't hold up others
+        return next((r for r in sorted(self._waiting, key=_Request.order) if self._startable(r)), None)
+
+    def _acquire(self, priority, timeout, owner):
+        timeout = self.timeouts[priority] if timeout is None else timeout
+        start = time.monotonic()
+        request = _Request(priority, next(self._seq), owner, start + timeout if timeout else None)
+        with self._cond:
+            self._waiting.append(request)
+            try:
+                while True:
+                    if request.cancelled:
+                        raise LLMCancelled()
+                    if self._next() is request:
+                        break
+                    remaining = request.deadline - time.monotonic() if request.deadline else None
+                    if remaining is not None and remaining <= 0:
+                        raise LLMTimeout(f"LLM call still queued after {timeout:g}s")
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiting.remove(request)
+                self._cond.notify_all()
+                raise
+            self._waiting.remove(request)
+            self._running.append(request)
+            # Another waiter may be startable too, e.g. an answer behind a blocked summary
+            self._cond.notify_all()
+        metrics.observe("pdfqa_llm_queue_seconds", time.monotonic() - start, priority=PRIORITY_NAMES[priority])
+        return request
+
+    def _release(self, request):
+        with self._cond:
+            self._running.remove(request)
+            self._cond.notify_all()
+
+    def stream(self, produce, priority=INTERACTIVE, timeout=None, owner=None):
+        """Yield the tokens of produce() (called once a slot is free), within the timeout.
+
+        Raises LLMTimeout or LLMCancelled; the underlying stream is closed either way.
+        """
+        outcome = "error"
+        try:
+            request = self._acquire(priority, timeout, owner)
+        except (LLMTimeout, LLMCancelled) as e:
+            outcome = "timeout" if isinstance(e, LLMTimeout) else "cancelled"
+            metrics.inc("pdfqa_llm_calls_total", priority=PRIORITY_NAMES[priority], outcome=outcome)
+            raise
+        tokens = None
+        try:
+            tokens = iter(produce())
+            for token in tokens:
+                if request.cancelled:
+                    outcome = "cancelled"
+                    raise LLMCancelled()
+                if request.deadline and time.monotonic() > request.deadline:
+                    outcome = "timeout"
+                    raise LLMTimeout("LLM call exceeded its timeout")
+                yield token
+            outcome = "ok"
+        except GeneratorExit:
+            outcome = "abandoned"  # The caller stopped reading, e.g. Gradio closed the chat
+            raise
+        finally:
+            if hasattr(tokens, "close"):
+                tokens.close()
+            self._release(request)
+            metrics.inc("pdfqa_llm_calls_total", priority=PRIORITY_NAMES[priority], outcome=outcome)
+
+    def call(self, produce, priority=INTERACTIVE, timeout=None, owner=None):
+        return "".join(self.stream(produce, priority=priority, timeout=timeout, owner=owner))
+
+    def cancel(self, owner):
+        """Cancel the queued and running calls of owner (e.g. a session); returns how many."""
+        with self._cond:
+            requests = [r for r in self._waiting + self._running if r.owner == owner and not r.cancelled]
+            for request in requests:
+                request.cancelled = True
+            self._cond.notify_all()
+        return len(requests)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "running": len(self._running),
+                "queued": {name: sum(r.priority == p for r in self._waiting) for p, name in enumerate(PRIORITY_NAMES)},
+                "concurrency": self.concurrency,
+                "background_slots": self.background_slots,
+            }
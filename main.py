@@ -1,16 +1,40 @@
+import time
+
+_start = time.perf_counter()  # Process start, for time-to-first-window
+
+import multiprocessing
+import urllib.request
 import webview
-import threading
-import os
 
-def launch_backend():
-    os.system("python ui_gradio.py")
+from config import SERVER_PORT
 
-# Start Gradio server in background
-threading.Thread(target=launch_backend).start()
+def wait_for_server(url, timeout=60.0, interval=0.05):
+    # Poll the health endpoint instead of sleeping a fixed time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(interval)
+    return False
 
-# Launch native window after short delay
-import time
-time.sleep(3)
+def main():
+    # Start the Gradio server in-process; models warm up in the background
+    import ui_gradio
+    server = ui_gradio.start_server(host="127.0.0.1", port=SERVER_PORT)
+
+    base_url = f"http://127.0.0.1:{SERVER_PORT}"
+    if not wait_for_server(f"{base_url}/health"):
+        print("⚠️ Server did not become healthy in time; opening the window anyway.")
+
+    window = webview.create_window("Offline PDF Assistant", base_url, width=1280, height=800)
+    window.events.shown += lambda: print(f"🪟 Time to first window: {time.perf_counter() - _start:.2f}s")
+    webview.start()
+    server.should_exit = True
 
-webview.create_window("Offline PDF Assistant", "http://localhost:7860", width=1280, height=800)
-webview.start()
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Extraction workers re-launch the frozen .exe
+    main()
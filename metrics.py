@@ -0,0 +1,185 @@
+"""Stage timings aggregated into histograms, Prometheus text output and an on-demand profiler."""
+import cProfile
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from config import PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond searches up to multi-minute ingests
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+HELP = {
+    "pdfqa_stage_seconds": "Time spent per pipeline stage",
+    "pdfqa_llm_first_token_seconds": "Time from LLM call to first streamed token",
+    "pdfqa_ocr_page_seconds": "Tesseract time per OCR'd PDF page",
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}  # (name, labels) -> value
+_gauge_sources = []  # callables returning {name: value}
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, seconds, **labels):
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        if hist is None:
+            hist = _histograms[_key(name, labels)] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(BUCKETS)] += 1
+        hist[-1] += seconds
+
+def inc(name, value=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+def register_gauges(source):
+    """Report the values of source() -> {metric name: number} on every scrape."""
+    _gauge_sources.append(source)
+
+class Span:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+
+@contextmanager
+def span(stage, **labels):
+    """Time a block as one observation of pdfqa_stage_seconds{stage=...}."""
+    result = Span()
+    try:
+        yield result
+    finally:
+        result.seconds = time.perf_counter() - result.start
+        observe("pdfqa_stage_seconds", result.seconds, stage=stage, **labels)
+
+def timed(stage, **labels):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class TimedIterator:
+    """Wraps an iterator and adds up the time spent producing its items."""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        histograms = {key: list(hist) for key, hist in _histograms.items()}
+        counters = dict(_counters)
+    seen = set()
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, hist):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        cumulative += hist[len(BUCKETS)]
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {hist[-1]}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for source in _gauge_sources:
+        try:
+            values = source()
+        except Exception as e:
+            logger.warning("Gauge source failed: %s", e)
+            continue
+        for name, value in values.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+# ---------------- Profiling ----------------
+
+_profile_requests = 0
+MAX_PROFILE_REQUESTS = 20  # Each one slows a request and writes a .prof file
+
+def profile_next(count=1):
+    """Profile the next count requests wrapped with profiled(), at most MAX_PROFILE_REQUESTS.
+
+    Returns how many are armed.
+    """
+    global _profile_requests
+    with _lock:
+        _profile_requests = max(0, min(count, MAX_PROFILE_REQUESTS))
+        return _profile_requests
+
+def _take_profile_slot():
+    global _profile_requests
+    with _lock:
+        if _profile_requests <= 0:
+            return False
+        _profile_requests -= 1
+        return True
+
+def profiled(gen, name):
+    """Run generator gen, under cProfile if a profile was requested.
+
+    The profiler is switched on per step, because Gradio may resume a generator
+    on a different worker thread each time. Stats go to PROFILE_DIR as .prof
+    files (view with snakeviz, or `flameprof` for a flame graph).
+    """
+    if not _take_profile_slot():
+        yield from gen
+        return
+    profiler = cProfile.Profile()
+    try:
+        while True:
+            profiler.enable()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                profiler.disable()
+            yield item
+    finally:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        logger.info("Profile of %s written to %s", name, path)
@@ -0,0 +1,152 @@
+"""OCR for PDF pages without a usable text layer, in a process pool, cached per page."""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from config import OCR, OCR_DPI, OCR_LANGUAGE, OCR_MIN_CHARS, OCR_WORKERS, OCR_CACHE_DIR
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the OCR call or its post-processing changes so old results are redone
+OCR_VERSION = 1
+
+_WORD_CHAR = re.compile(r"\w")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def ocr_params():
+    """Part of the embedding cache key: OCR settings change the text of scanned pages."""
+    return f"{OCR_LANGUAGE}@{OCR_DPI}" if OCR else "off"
+
+def has_text_layer(text, min_chars=OCR_MIN_CHARS):
+    return len(_WORD_CHAR.findall(text)) >= min_chars
+
+def page_hash(doc, page):
+    """Hash of what a page draws: its content stream and raw image data, whatever file it is in."""
+    h = hashlib.sha256(f"{OCR_VERSION}:{OCR_LANGUAGE}:{OCR_DPI}:{page.rotation}".encode("utf-8"))
+    h.update(page.read_contents())
+    for image in page.get_images(full=True):
+        h.update(doc.xref_stream_raw(image[0]) or b"")
+    return h.hexdigest()
+
+def _path(key):
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}.txt")
+
+def cached(key):
+    try:
+        with open(_path(key), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _store(key, text):
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+def _init_worker():
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def ocr_page(path, page_number, dpi=OCR_DPI, language=OCR_LANGUAGE):
+    """OCR one page (0-based); returns (text, seconds). Runs in a pool worker."""
+    start = time.perf_counter()
+    with fitz.open(path) as doc:
+        page = doc[page_number]
+        textpage = page.get_textpage_ocr(dpi=dpi, language=language, full=True)
+        text = page.get_text(textpage=textpage)
+    return text, time.perf_counter() - start
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_worker)
+        return _pool
+
+def fill_pages(path, texts, first=0, doc=None, workers=OCR_WORKERS):
+    """Yield a PDF's page texts in order, OCR-ing pages that have images but no usable text.
+
+    texts are the text-layer results for pages first, first + 1, ... of path.
+    OCR results are cached by page_hash(), so re-uploads (or the same scan in
+    another file) skip Tesseract. Up to 2 * workers OCR pages are in flight; with
+    workers <= 1 pages are OCR'd inline. A failing OCR keeps the text layer.
+    """
+    if not OCR:
+        yield from texts
+        return
+    own_doc = doc is None
+    pending = deque()  # text, or (page number, cache key, Future, text layer)
+    stats = {"ocr": 0, "cache": 0, "failed": 0, "seconds": 0.0}
+    window = 2 * max(1, workers)
+
+    def resolve(item):
+        if isinstance(item, str):
+            return item
+        page_number, key, future, layer = item
+        try:
+            text, seconds = future.result()
+        except Exception as e:
+            if not stats["failed"]:
+                logger.warning("OCR of %s page %d failed: %s", path, page_number + 1, e)
+            stats["failed"] += 1
+            return layer
+        stats["ocr"] += 1
+        stats["seconds"] += seconds
+        metrics.observe("pdfqa_ocr_page_seconds", seconds)
+        _store(key, text)
+        return text
+
+    try:
+        for page_number, text in enumerate(texts, first):
+            if has_text_layer(text):
+                pending.append(text)
+            else:
+                if doc is None:
+                    doc = fitz.open(path)
+                page = doc[page_number]
+                if not page.get_images():
+                    pending.append(text)  # Blank or drawn page: nothing to recognise
+                else:
+                    key = page_hash(doc, page)
+                    result = cached(key)
+                    if result is not None:
+                        stats["cache"] += 1
+                        pending.append(result)
+                    elif workers <= 1:
+                        future = Future()
+                        try:
+                            future.set_result(ocr_page(path, page_number))
+                        except Exception as e:
+                            future.set_exception(e)
+                        pending.append((page_number, key, future, text))
+                    else:
+                        pending.append((page_number, key, _get_pool().submit(ocr_page, path, page_number), text))
+            while pending and (isinstance(pending[0], str) or len(pending) > window):
+                yield resolve(pending.popleft())
+        while pending:
+            yield resolve(pending.popleft())
+    finally:
+        for item in pending:
+            if not isinstance(item, str):
+                item[2].cancel()
+        if own_doc and doc is not None:
+            doc.close()
+        for source in ("ocr", "cache"):
+            if stats[source]:
+                metrics.inc("pdfqa_ocr_pages_total", stats[source], source=source)
+        if stats["ocr"] or stats["cache"] or stats["failed"]:
+            per_page = stats["seconds"] / stats["ocr"] if stats["ocr"] else 0.0
+            logger.info("%s: OCR'd %d pages (%.2fs per page), %d from cache, %d failed",
+                        os.path.basename(path), stats["ocr"], per_page, stats["cache"], stats["failed"])
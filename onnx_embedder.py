@@ -0,0 +1,69 @@
+"""Sentence embeddings with ONNX Runtime on CPU, from a model written by export_onnx.py.
+
+Needs only onnxruntime and tokenizers at run time, not torch.
+"""
+import json
+import os
+
+import numpy as np
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+META_FILE = "meta.json"
+TOKENIZER_FILE = "tokenizer.json"
+
+# Smallest cosine similarity to the PyTorch embedding that export_onnx.py accepts per
+# variant; above these, search results match the sentence-transformers index
+COSINE_TOLERANCE = {"float32": 0.9999, "int8": 0.99}
+
+class OnnxEncoder:
+    """Drop-in for the parts of SentenceTransformer that embedder.py uses."""
+
+    def __init__(self, model_path, tokenizer_path, meta, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads  # 0 = one per physical core
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.meta = meta
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=meta["max_length"])
+        self.tokenizer.enable_padding(pad_id=meta["pad_id"], pad_token=meta["pad_token"])
+
+    @classmethod
+    def load(cls, model_dir, quantized=True, threads=0):
+        meta_path = os.path.join(model_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No ONNX model in {model_dir}; run `python export_onnx.py` first")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} missing; run `python export_onnx.py`"
+                                    + (" --quantize" if quantized else ""))
+        # Only variants that matched the PyTorch vectors at export may share its index and cache
+        variant = "int8" if quantized else "float32"
+        cosine = meta.get("cosine", {}).get(variant, {}).get("min")
+        if cosine is None or cosine < COSINE_TOLERANCE[variant]:
+            raise ValueError(f"{model_path} was not verified against PyTorch (min cosine {cosine}, "
+                             f"needs {COSINE_TOLERANCE[variant]}); re-run `python export_onnx.py`")
+        return cls(model_path, os.path.join(model_dir, TOKENIZER_FILE), meta, threads=threads)
+
+    def get_sentence_embedding_dimension(self):
+        return self.meta["dim"]
+
+    def encode(self, texts, batch_size=32):
+        """Mean-pooled float32 embeddings, not normalised (embedder.py does that)."""
+        out = np.empty((len(texts), self.meta["dim"]), dtype="float32")
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[i:i + batch_size]))
+            feed = {
+                "input_ids": np.array([e.ids for e in encodings], dtype="int64"),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype="int64"),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype="int64"),
+            }
+            out[i:i + batch_size] = self.session.run(None, {k: v for k, v in feed.items() if k in self.inputs})[0]
+        return out
@@ -24,10 +24,26 @@
 import fitz  # PyMuPDF
 import docx
 import pandas as pd
+import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_text_from_pdf(file_path):
-    doc = fitz.open(file_path)
-    return "".join(page.get_text() for page in doc)
+from config import EXTRACT_WORKERS, PDF_SPLIT_PAGES, TABLE_BATCH_ROWS
+from chunk_store import is_table
+from ocr import fill_pages
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def extract_pages_from_pdf(file_path, page_range=None):
+    with fitz.open(file_path) as doc:
+        pages = doc if page_range is None else (doc[i] for i in range(*page_range))
+        return [page.get_text() for page in pages]
+
+def extract_text_from_pdf(file_path, page_range=None):
+    first = page_range[0] if page_range else 0
+    return "".join(fill_pages(file_path, extract_pages_from_pdf(file_path, page_range), first=first))
 
 def extract_text_from_docx(file_path):
     doc = docx.Document(file_path)
@@ -37,25 +53,202 @@ def extract_text_from_txt(file_path):
     with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
         return f.read()
 
+def iter_table_rows(file_path, batch_rows=TABLE_BATCH_ROWS):
+    """Yield a CSV/TSV file's header, then each data row, as one " | "-separated line each.
+
+    The file is parsed batch_rows rows at a time, so memory stays bounded
+    whatever its size. Line breaks inside cells become spaces.
+    """
+    sep = "\t" if file_path.lower().endswith(".tsv") else ","
+    reader = pd.read_csv(file_path, sep=sep, dtype=str, keep_default_na=False, chunksize=batch_rows,
+                         encoding_errors="ignore")
+    with reader:
+        header = None
+        for frame in reader:
+            if header is None:
+                header = _table_line(str(name) for name in frame.columns)
+                yield header
+            # A batch as nested lists is about twice as fast to walk as itertuples()
+            for row in frame.to_numpy().tolist():
+                yield _table_line(row)
+
+def _table_line(cells):
+    line = " | ".join(cells)
+    return " ".join(line.split()) if "\n" in line or "\r" in line else line
+
 def extract_text_from_csv(file_path):
-    df = pd.read_csv(file_path)
-    return df.to_string()
-
-def extract_text_from_multiple_files(file_paths):
-    ext_map = {
-        ".pdf": extract_text_from_pdf,
-        ".docx": extract_text_from_docx,
-        ".txt": extract_text_from_txt,
-        ".csv": extract_text_from_csv,
-    }
+    return "\n".join(iter_table_rows(file_path))
+
+EXTRACTORS = {
+    ".pdf": extract_text_from_pdf,
+    ".docx": extract_text_from_docx,
+    ".txt": extract_text_from_txt,
+    ".csv": extract_text_from_csv,
+    ".tsv": extract_text_from_csv,
+}
+
+def _get_extractor(path):
+    ext = path.lower().split(".")[-1]
+    return EXTRACTORS.get(f".{ext}")
+
+def _extraction_tasks(path, split_pages):
+    # Large PDFs are split into page ranges so one big file still uses several workers
+    extractor = _get_extractor(path)
+    if extractor is extract_text_from_pdf and split_pages:
+        with fitz.open(path) as doc:
+            page_count = doc.page_count
+        if page_count > split_pages:
+            return [(path, (start, min(start + split_pages, page_count)))
+                    for start in range(0, page_count, split_pages)]
+    return [(path, None)]
+
+def _run_extraction(path, page_range, segments=False):
+    # PDFs come back as a list of text-layer pages (OCR happens in _finish, in the
+    # parent's OCR pool); other files as [text] with segments=True, else as text
+    extractor = _get_extractor(path)
+    if extractor is extract_text_from_pdf:
+        return extract_pages_from_pdf(path, page_range)
+    text = extractor(path)
+    return [text] if segments else text
+
+def _finish(path, result, segments):
+    if _get_extractor(path) is not extract_text_from_pdf:
+        return result
+    pages = list(fill_pages(path, result))
+    return pages if segments else "".join(pages)
+
+def _timed_extraction(path, page_range, segments):
+    # Timed inside the worker, so the parse metric excludes queueing in the pool
+    start = time.perf_counter()
+    result = _run_extraction(path, page_range, segments)
+    return result, time.perf_counter() - start
+
+def _submit(pool, path, split_pages, segments):
+    try:
+        return [pool.submit(_timed_extraction, *task, segments) for task in _extraction_tasks(path, split_pages)]
+    except Exception as e:
+        return e
+
+def _collect(path, futures, segments):
+    if isinstance(futures, Exception):
+        return path, None, futures
+    try:
+        results = [f.result() for f in futures]
+    except Exception as e:
+        return path, None, e
+    metrics.observe("pdfqa_stage_seconds", sum(seconds for _, seconds in results), stage="parse")
+    if _get_extractor(path) is extract_text_from_pdf:
+        try:
+            return path, _finish(path, [page for pages, _ in results for page in pages], segments), None
+        except Exception as e:
+            return path, None, e
+    if segments:
+        return path, [page for pages, _ in results for page in pages], None
+    return path, "".join(text for text, _ in results), None
+
+def iter_extracted_files(file_paths, workers=EXTRACT_WORKERS, split_pages=PDF_SPLIT_PAGES, segments=False):
+    """Yield (path, text, error) per supported file, in input order.
+
+    With workers > 1 files (and page ranges of large PDFs) are extracted in a
+    process pool, keeping at most 2 * workers files in flight. A failing file
+    yields its exception instead of aborting the batch. With segments=True the
+    text is a list whose items are the pages of a PDF (one item for other formats).
+    """
+    file_paths = [p for p in file_paths if _get_extractor(p)]
+    if workers <= 1:
+        for path in file_paths:
+            try:
+                with metrics.span("parse"):
+                    text = _finish(path, _run_extraction(path, None, segments), segments)
+            except Exception as e:
+                yield path, None, e
+                continue
+            yield path, text, None
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in file_paths:
+            pending.append((path, _submit(pool, path, split_pages, segments)))
+            if len(pending) >= 2 * workers:
+                yield _collect(*pending.popleft(), segments)
+        while pending:
+            yield _collect(*pending.popleft(), segments)
+
+def extract_text_from_multiple_files(file_paths, workers=EXTRACT_WORKERS, errors=None, split_pages=PDF_SPLIT_PAGES):
     texts = {}
-    for path in file_paths:
-        ext = path.lower().split(".")[-1]
-        extractor = ext_map.get(f".{ext}")
-        if extractor:
-            texts[path] = extractor(path)
+    for path, text, error in iter_extracted_files(file_paths, workers=workers, split_pages=split_pages):
+        if error is not None:
+            logger.warning("Failed to extract %s: %s", path, error)
+            if errors is not None:
+                errors[path] = error
+            continue
+        texts[path] = text
     return texts
 
+# ---------------- Streaming readers ----------------
+
+TEXT_BLOCK_SIZE = 1 << 16
+
+def iter_pdf_pages(file_path):
+    with fitz.open(file_path) as doc:
+        yield from fill_pages(file_path, (page.get_text() for page in doc), doc=doc)
+
+def iter_docx_paragraphs(file_path):
+    doc = docx.Document(file_path)
+    for i, p in enumerate(doc.paragraphs):
+        yield ("\n" if i else "") + p.text
+
+def iter_txt_blocks(file_path, block_size=TEXT_BLOCK_SIZE):
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for block in iter(lambda: f.read(block_size), ""):
+            yield block
+
+def iter_text_segments(file_path):
+    """Yield a file's text in pieces whose concatenation equals the extract_text_* result."""
+    ext = file_path.lower().split(".")[-1]
+    if ext == "pdf":
+        return iter_pdf_pages(file_path)
+    if ext == "docx":
+        return iter_docx_paragraphs(file_path)
+    if ext == "txt":
+        return iter_txt_blocks(file_path)
+    if is_table(file_path):
+        return (("\n" if i else "") + line for i, line in enumerate(iter_table_rows(file_path)))
+    return iter([])
+
+def iter_chunk_spans(segments, chunk_size=500, overlap=50):
+    """Like iter_chunks, but yields (chunk, character offset, index of the segment it starts in).
+
+    For PDFs segments are pages, so the segment index is the 0-based page number.
+    """
+    step = chunk_size - overlap
+    buf = ""
+    buf_start = 0  # Offset of buf[0] in the whole text
+    starts = deque()  # (offset, index) of segments that begin at or after buf_start, plus the one before
+
+    def segment_at(offset):
+        while len(starts) > 1 and starts[1][0] <= offset:
+            starts.popleft()
+        return starts[0][1]
+
+    for index, segment in enumerate(segments):
+        starts.append((buf_start + len(buf), index))
+        buf += segment
+        while len(buf) >= chunk_size:
+            yield buf[:chunk_size], buf_start, segment_at(buf_start)
+            buf = buf[step:]
+            buf_start += step
+    while buf:
+        yield buf[:chunk_size], buf_start, segment_at(buf_start)
+        buf = buf[step:]
+        buf_start += step
+
+def iter_chunks(segments, chunk_size=500, overlap=50):
+    # Same windows as chunk_text("".join(segments)) without holding the whole text
+    for chunk, _, _ in iter_chunk_spans(segments, chunk_size, overlap):
+        yield chunk
+
 def chunk_text(text, chunk_size=500, overlap=50):
     chunks = []
     start = 0
@@ -64,3 +257,9 @@ def chunk_text(text, chunk_size=500, overlap=50):
         chunks.append(text[start:end])
         start += chunk_size - overlap
     return chunks
+
+def merge_chunks(chunks, overlap=50):
+    # Inverse of chunk_text: every chunk after the first repeats `overlap` chars
+    if not chunks:
+        return ""
+    return chunks[0] + "".join(chunk[overlap:] for chunk in chunks[1:])
@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+
+from config import PREVIEW_DIR, PREVIEW_DPI, PREVIEW_WORKERS
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def render_preview(pdf_path, out_path, dpi=PREVIEW_DPI):
+    """Render the first page of pdf_path to a JPEG at out_path; False for empty documents."""
+    with fitz.open(pdf_path) as doc:
+        if not doc.page_count:
+            return False
+        data = doc[0].get_pixmap(dpi=dpi).tobytes("jpeg")
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(out_path + ".tmp", out_path)
+    return True
+
+class Previewer:
+    """First-page thumbnails rendered in a background pool, cached on disk by file hash.
+
+    PyMuPDF is not thread-safe and ingestion parses PDFs in threads of its own,
+    so pages are rasterized in worker processes, like OCR. The threads only wait
+    for them, keeping metrics and logging in this process.
+    """
+
+    def __init__(self, workers=PREVIEW_WORKERS, cache_dir=PREVIEW_DIR, dpi=PREVIEW_DPI):
+        self.cache_dir = cache_dir
+        self.dpi = dpi
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self.pending = {}  # cache path -> Future, so re-uploads share in-flight renders
+        self._lock = threading.Lock()
+        self._processes = None  # Started on the first render
+
+    def _process_pool(self):
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.workers)
+            return self._processes
+
+    def path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}-{self.dpi}.jpg")
+
+    def submit(self, pdf_path, content_hash):
+        """Return a Future for the thumbnail's path, or None if the PDF has no pages."""
+        out_path = self.path(content_hash)
+        if os.path.exists(out_path):
+            metrics.inc("pdfqa_preview_cache_hits_total")
+            future = Future()
+            future.set_result(out_path)
+            return future
+        with self._lock:
+            future = self.pending.get(out_path)
+            if future is None:
+                future = self.pool.submit(self._render, pdf_path, out_path)
+                self.pending[out_path] = future
+            return future
+
+    def _render(self, pdf_path, out_path):
+        try:
+            with metrics.span("preview"):
+                rendered = self._process_pool().submit(render_preview, pdf_path, out_path, self.dpi).result()
+                return out_path if rendered else None
+        except Exception as e:
+            logger.warning("Preview of %s failed: %s", pdf_path, e)
+            return None
+        finally:
+            with self._lock:
+                self.pending.pop(out_path, None)
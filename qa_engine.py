@@ -76,18 +76,51 @@
 #     memory.clear()
 
 
-from langchain_ollama import OllamaLLM
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain.memory import ConversationBufferMemory
 
-# Load model
-llm = OllamaLLM(model="mistral")
+from config import LLM_MODEL, OLLAMA_URL, LLM_TIMEOUT, MEMORY_MAX_SESSIONS, MEMORY_IDLE_TTL, MEMORY_MAX_TOKENS, MEMORY_MODE
+from context_builder import estimate_tokens
+from llm_scheduler import LLMScheduler, INTERACTIVE, FOLLOWUP, BACKGROUND
+from session_memory import SessionMemoryManager, format_history
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Model and chains are built on first use (or by warmup) to keep startup fast
+_llm = None
+_chains = {}
+_llm_lock = threading.Lock()
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_ollama import OllamaLLM
+                # The read timeout covers a model that never sends a first token
+                _llm = OllamaLLM(model=LLM_MODEL, base_url=OLLAMA_URL, client_kwargs={"timeout": LLM_TIMEOUT})
+    return _llm
+
+def set_llm(llm):
+    """Swap in another LLM (e.g. a local stub); chains are rebuilt on next use."""
+    global _llm
+    with _llm_lock:
+        _llm = llm
+        _chains.clear()
+
+def warmup():
+    get_llm()
 
 # Prompt
 contextual_prompt = PromptTemplate(
-    input_variables=["context", "question"],
+    input_variables=["context", "chat_history", "question"],
     template="""
 You are a helpful assistant answering based on the following document context.
 Only respond based on the context. If unsure, say "I don't know".
@@ -95,45 +128,151 @@ Only respond based on the context. If unsure, say "I don't know".
 Context:
 {context}
 
+Conversation so far:
+{chat_history}
+
 Question:
 {question}
 
 Answer:"""
 )
 
-qa_chain = contextual_prompt | llm
-
 # Session-based memory cache
-memory_sessions = {}
+# Folds turns that no longer fit the memory token cap into a running summary
+history_summary_prompt = PromptTemplate(
+    input_variables=["summary", "text"],
+    template="""
+Update the summary of a conversation about some documents with the new lines below.
+Keep it short and keep facts the user may refer back to.
 
-def get_memory(session_id: str):
-    if session_id not in memory_sessions:
-        memory_sessions[session_id] = ConversationBufferMemory(
-            memory_key="chat_history",
-            input_key="question",
-            return_messages=True,
-        )
-    return memory_sessions[session_id]
+Current summary:
+{summary}
+
+New lines:
+{text}
 
-qa_chain_with_memory = RunnableWithMessageHistory(
-    qa_chain,
-    lambda session_id: get_memory(session_id),
-    input_messages_key="question",
-    history_messages_key="chat_history"
+Updated summary:
+"""
+)
+
+def summarize_history(summary, text):
+    return _invoke("history_summary", {"summary": summary or "(none)", "text": text})
+
+# History is added while the answer still holds its scheduler slot, so the summary
+# runs from this pool instead; with one slot it would otherwise wait for itself
+_history_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+memory = SessionMemoryManager(
+    max_sessions=MEMORY_MAX_SESSIONS,
+    idle_ttl=MEMORY_IDLE_TTL,
+    max_tokens=MEMORY_MAX_TOKENS,
+    mode=MEMORY_MODE,
+    summarize=summarize_history,
+    defer=_history_pool.submit,
 )
 
+def get_memory(session_id: str):
+    return memory.get(session_id)
+
+def _render_history(inputs):
+    return format_history(inputs.get("chat_history") or []) or "(none)"
+
+def _build_chain(name):
+    if name == "qa":
+        return RunnablePassthrough.assign(chat_history=_render_history) | contextual_prompt | get_llm()
+    if name == "qa_with_memory":
+        return RunnableWithMessageHistory(
+            _get_chain("qa"),
+            lambda session_id: get_memory(session_id),
+            input_messages_key="question",
+            history_messages_key="chat_history"
+        )
+    if name == "followup":
+        return followup_prompt | get_llm()
+    if name == "history_summary":
+        return history_summary_prompt | get_llm()
+    if name == "summary":
+        return summary_prompt | get_llm()
+    if name == "section_summary":
+        return section_summary_prompt | get_llm()
+    if name == "combine_summary":
+        return combine_summary_prompt | get_llm()
+    raise KeyError(name)
+
+def _get_chain(name):
+    chain = _chains.get(name)
+    if chain is None:
+        chain = _chains.setdefault(name, _build_chain(name))
+    return chain
+
+# Every LLM call goes through one scheduler: answers first, then follow-ups, then summaries
+scheduler = LLMScheduler()
+CHAIN_PRIORITY = {
+    "qa": INTERACTIVE,
+    "qa_with_memory": INTERACTIVE,
+    "followup": FOLLOWUP,
+    "history_summary": FOLLOWUP,
+    "summary": BACKGROUND,
+    "section_summary": BACKGROUND,
+    "combine_summary": BACKGROUND,
+}
+
+def _invoke(name, inputs, config=None, owner=None):
+    return "".join(_stream(name, inputs, config=config, owner=owner))
+
+def _stream(name, inputs, config=None, owner=None):
+    """Stream a chain's tokens once the scheduler grants a slot; owner (a session ID) can cancel it."""
+    def produce():
+        # Every LLM call is timed per chain, so slow answers can be told apart from slow follow-ups;
+        # time spent queued is reported separately as pdfqa_llm_queue_seconds
+        with metrics.span("llm", chain=name) as span:
+            first = True
+            for token in _get_chain(name).stream(inputs, config=config):
+                if first:
+                    metrics.observe("pdfqa_llm_first_token_seconds", time.perf_counter() - span.start, chain=name)
+                    first = False
+                yield token
+    yield from scheduler.stream(produce, priority=CHAIN_PRIORITY[name], owner=owner)
+
+def cancel_session(session_id):
+    """Stop the session's queued and running LLM calls, e.g. when the user leaves or presses Stop."""
+    return scheduler.cancel(session_id)
+
+def prompt_tokens(context, question, session_id="default"):
+    # Estimate for the templated prompt, including the bounded chat history
+    history = memory.peek(session_id)
+    chat_history = _render_history({"chat_history": history.messages if history else []})
+    return estimate_tokens(contextual_prompt.format(context=context, chat_history=chat_history, question=question))
+
+def generate_answer(context_chunks, question):
+    """Answer without conversation memory, e.g. for batch evaluation."""
+    return _invoke("qa", {"context": "\n".join(context_chunks), "question": question})
+
 def generate_answer_with_memory(context_chunks, question, session_id="default"):
     context = "\n".join(context_chunks)
-    return qa_chain_with_memory.invoke(
+    logger.info("Answer prompt: ~%d tokens", prompt_tokens(context, question, session_id))
+    return _invoke(
+        "qa_with_memory",
         {"context": context, "question": question},
-        config={"configurable": {"session_id": session_id}}
+        config={"configurable": {"session_id": session_id}},
+        owner=session_id,
     )
 
-def summarize_text(text, max_chars=2000):
-    short_text = text[:max_chars]
-    summary_prompt = PromptTemplate(
-        input_variables=["text"],
-        template="""
+def stream_answer_with_memory(context_chunks, question, session_id="default"):
+    """Like generate_answer_with_memory, but yields the answer text as the LLM produces it."""
+    context = "\n".join(context_chunks)
+    logger.info("Answer prompt: ~%d tokens", prompt_tokens(context, question, session_id))
+    yield from _stream(
+        "qa_with_memory",
+        {"context": context, "question": question},
+        config={"configurable": {"session_id": session_id}},
+        owner=session_id,
+    )
+
+# 📋 Summary prompts, built once
+summary_prompt = PromptTemplate(
+    input_variables=["text"],
+    template="""
 Summarize the following document clearly and concisely in bullet points.
 
 Document:
@@ -141,12 +280,63 @@ Document:
 
 Summary:
 """
-    )
-    return (summary_prompt | llm).invoke({"text": short_text})
+)
+
+# Map step: one section of a longer document
+section_summary_prompt = PromptTemplate(
+    input_variables=["text"],
+    template="""
+Summarize the following section of a document in a few concise bullet points.
+Keep names, numbers and key facts.
+
+Section:
+{text}
+
+Summary:
+"""
+)
+
+# Reduce step: merge section summaries into one
+combine_summary_prompt = PromptTemplate(
+    input_variables=["text"],
+    template="""
+The following are bullet-point summaries of consecutive sections of one document.
+Combine them into a single clear and concise bullet-point summary of the whole document,
+removing repetition.
+
+Section summaries:
+{text}
+
+Summary:
+"""
+)
+
+def summarize_text(text, max_chars=2000):
+    short_text = text[:max_chars]
+    return _invoke("summary", {"text": short_text})
+
+def summarize_section(text):
+    return _invoke("section_summary", {"text": text})
+
+def combine_summaries(summaries):
+    return _invoke("combine_summary", {"text": "\n\n".join(summaries)})
 
 def reset_memory(session_id="default"):
-    if session_id in memory_sessions:
-        memory_sessions[session_id].clear()
+    memory.reset(session_id)
+
+def has_history(session_id="default"):
+    history = memory.peek(session_id)
+    return bool(history and history.messages)
+
+def record_exchange(question, answer, session_id="default"):
+    # Keeps memory consistent when an answer is served without calling the chain
+    get_memory(session_id).add_messages([HumanMessage(content=question), AIMessage(content=answer)])
+
+def memory_stats():
+    return memory.stats()
+
+def scheduler_stats():
+    return scheduler.stats()
 
 
 # 🔮 Generate follow-up suggestions
@@ -162,8 +352,6 @@ Follow-up Suggestions:
 """
 )
 
-followup_chain = followup_prompt | llm
-
-def generate_followups(question, answer):
-    result = followup_chain.invoke({"question": question, "answer": answer})
+def generate_followups(question, answer, session_id=None):
+    result = _invoke("followup", {"question": question, "answer": answer}, owner=session_id)
     return [line.strip("-• \n") for line in result.strip().splitlines() if line.strip()]
@@ -1,15 +1,445 @@
+import bisect
+import glob
+import json
+import math
+import os
+import uuid
 import faiss
 import numpy as np
 
+from config import INDEX_TYPE, NPROBE, EF_SEARCH, VECTOR_PRECISION
+from chunk_store import ChunkStore
+from sparse_index import BM25Index, reciprocal_rank_fusion
+import metrics
+
+# Bump when the on-disk layout changes; older directories are ignored on load
+INDEX_FORMAT_VERSION = 5
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+# Vector storage: float16 halves memory, int8 (scalar quantizer, ranges learned per
+# dimension) quarters it; IVF-PQ always uses its own, smaller codes
+PRECISIONS = ("float32", "float16", "int8")
+_CODECS = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+SEARCH_MODES = ("dense", "sparse", "hybrid")
+
+HNSW_M = 32
+TRAIN_POINTS_PER_LIST = 39  # FAISS warns below ~39 training points per centroid
+MAX_TOMBSTONE_RATIO = 0.1  # Compact HNSW once this share of its vectors is deleted
+HYBRID_CANDIDATES = 4  # Each ranker contributes top_k * this many candidates to fusion
+SQ_TRAIN_POINTS = 1000  # int8 storage waits in float32 until this many vectors can train its ranges
+SQ_TRAIN_SAMPLE = 65536
+MAX_SELECTOR_RANGES = 16  # Beyond this many ID ranges a hash-set selector is cheaper than chained ranges
+
+def choose_index_type(n):
+    # Exact search is fast enough for small corpora; beyond that trade recall for speed, then memory
+    if n < 20_000:
+        return "flat"
+    if n < 200_000:
+        return "hnsw"
+    if n < 2_000_000:
+        return "ivf"
+    return "ivfpq"
+
+def _nlist(n):
+    return max(1, int(4 * math.sqrt(n)))
+
+def _pq_m(dim):
+    # Largest sub-quantizer count dividing dim with at least 8 dims per sub-vector
+    return max(m for m in range(1, dim // 8 + 1) if dim % m == 0)
+
+def _min_train_size(index_type, n):
+    if index_type == "ivf":
+        return _nlist(n) * TRAIN_POINTS_PER_LIST
+    if index_type == "ivfpq":
+        return max(_nlist(n), 256) * TRAIN_POINTS_PER_LIST
+    return 0
+
+def build_index(index_type, dim, n=0, precision="float32"):
+    """Create an empty inner-product index of the given type and storage precision sized for roughly n vectors.
+
+    Vectors are L2-normalised before they reach the index, so inner product is cosine similarity.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    codec = _CODECS[precision]
+    if index_type == "flat":
+        spec = f"IDMap2,{codec}"
+    elif index_type == "hnsw":
+        spec = f"IDMap2,HNSW{HNSW_M}" + ("" if precision == "float32" else f",{codec}")
+    # IVF indexes store IDs natively; wrapping them in IDMap would break remove_ids
+    elif index_type == "ivf":
+        spec = f"IVF{_nlist(n)},{codec}"
+    elif index_type == "ivfpq":
+        spec = f"IVF{_nlist(n)},PQ{_pq_m(dim)}"
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+    return faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+
+def _unit_rows(vectors):
+    vectors = np.array(vectors, dtype='float32', order='C', ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def _enable_id_lookup(index):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+class IdRanges:
+    """Chunk IDs as sorted, disjoint [start, end) ranges; a set for BM25 and a FAISS ID selector."""
+
+    def __init__(self, ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            elif end > start:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+        self._selector = None
+        self._parts = []  # FAISS selectors hold raw pointers to these, keep them alive
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def __contains__(self, chunk_id):
+        i = bisect.bisect_right(self.starts, chunk_id) - 1
+        return i >= 0 and chunk_id < self.ends[i]
+
+    def selector(self):
+        if self._selector is None:
+            ranges = list(zip(self.starts, self.ends))
+            if len(ranges) <= MAX_SELECTOR_RANGES:
+                self._parts = [faiss.IDSelectorRange(start, end) for start, end in ranges]
+                selector = self._parts[0]
+                for part in self._parts[1:]:
+                    selector = faiss.IDSelectorOr(selector, part)
+                    self._parts.append(selector)
+            else:
+                ids = np.concatenate([np.arange(start, end, dtype='int64') for start, end in ranges])
+                selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+            self._selector = selector
+        return self._selector
+
 class FAISSRetriever:
-    def __init__(self, dim):
-        self.index = faiss.IndexFlatL2(dim)
-        self.chunk_store = []  # Keep original chunks for display
+    def __init__(self, dim, index_type=INDEX_TYPE, precision=VECTOR_PRECISION):
+        if index_type != "auto" and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.dim = dim
+        self.index_type = index_type  # Requested type, may be "auto"
+        self.active_type = "flat"  # Type currently backing self.index
+        self.precision = precision  # Requested storage precision
+        self.active_precision = "float32" if precision == "int8" else precision  # int8 needs training data first
+        # IDMap2 gives every chunk a stable ID that survives removals
+        self.index = build_index("flat", dim, precision=self.active_precision)
+        self.chunk_store = ChunkStore()  # Chunk texts, documents and pages by chunk ID
+        self.doc_ranges = {}  # doc ID -> [start, end) chunk ID ranges; ingestion adds each document contiguously
+        self.doc_versions = {}  # doc ID -> caller-supplied version (e.g. content hash)
+        self.deleted = set()  # Tombstoned IDs for indexes without remove_ids (HNSW)
+        self._tombstones = None  # (IDSelectorBatch, IDSelectorNot) excluding `deleted`, built once per delete
+        self.sparse = BM25Index()  # Keyword index over the same chunk IDs
+        self.next_id = 0
+        self.version = uuid.uuid4().hex  # Changes on every content change, for cache invalidation
+
+    def copy(self):
+        """Independent copy; writers change a copy and publish it so readers keep a consistent snapshot."""
+        clone = FAISSRetriever.__new__(FAISSRetriever)
+        clone.__dict__.update(self.__dict__)
+        clone.index = faiss.clone_index(self.index)
+        _enable_id_lookup(clone.index)
+        clone.chunk_store = self.chunk_store.copy()
+        clone.doc_ranges = {doc_id: [list(r) for r in ranges] for doc_id, ranges in self.doc_ranges.items()}
+        clone.doc_versions = dict(self.doc_versions)
+        clone.deleted = set(self.deleted)
+        clone.sparse = self.sparse.copy()
+        return clone
+
+    def add(self, embeddings, chunks, doc_id=None, pages=None, starts=None):
+        """Index chunks; pages (0-based) and starts (character offsets in the document) are kept for display."""
+        ids = np.arange(self.next_id, self.next_id + len(chunks), dtype='int64')
+        with metrics.span("index"):
+            if len(ids):
+                self.index.add_with_ids(_unit_rows(embeddings), ids)
+            self.sparse.add(ids.tolist(), chunks)
+        self.chunk_store.append(self.next_id, chunks, doc_id=doc_id, pages=pages, starts=starts)
+        self.next_id += len(ids)
+        if doc_id is not None and len(ids):
+            ranges = self.doc_ranges.setdefault(doc_id, [])
+            if ranges and ranges[-1][1] == ids[0]:
+                ranges[-1][1] = self.next_id
+            else:
+                ranges.append([int(ids[0]), self.next_id])
+        if len(ids):
+            self.version = uuid.uuid4().hex
+        self._maybe_rebuild()
+        return ids
+
+    def add_document(self, doc_id, embeddings, chunks, version=None):
+        if doc_id in self.doc_ranges:
+            raise ValueError(f"Document already indexed: {doc_id}")
+        self.doc_ranges[doc_id] = []
+        self.doc_versions[doc_id] = version
+        return self.add(embeddings, chunks, doc_id=doc_id)
+
+    def _ranges_ids(self, ranges):
+        if not ranges:
+            return np.zeros(0, dtype='int64')
+        return np.concatenate([np.arange(start, end, dtype='int64') for start, end in ranges])
+
+    def remove_document(self, doc_id):
+        ids = self._ranges_ids(self.doc_ranges.pop(doc_id, None))
+        self.doc_versions.pop(doc_id, None)
+        if not len(ids):
+            return 0
+        if self.active_type == "hnsw":
+            self.deleted.update(ids.tolist())
+            self._tombstones = None
+        else:
+            self.index.remove_ids(ids)
+        self.sparse.remove(ids.tolist(), [self.chunk_store[i] for i in ids.tolist()])
+        self.chunk_store.remove(ids)
+        self.version = uuid.uuid4().hex
+        if len(self.deleted) > MAX_TOMBSTONE_RATIO * max(self.index.ntotal, 1):
+            self._rebuild(self.active_type)
+        return len(ids)
+
+    def replace_document(self, doc_id, embeddings, chunks, version=None):
+        self.remove_document(doc_id)
+        return self.add_document(doc_id, embeddings, chunks, version=version)
+
+    def set_document_version(self, doc_id, version):
+        # Streaming ingestion appends in batches and only stamps the version once complete
+        self.doc_versions[doc_id] = version
+
+    def has_document(self, doc_id, version=None):
+        if doc_id not in self.doc_ranges:
+            return False
+        return version is None or self.doc_versions.get(doc_id) == version
+
+    def documents(self):
+        return list(self.doc_ranges)
+
+    def document_of(self, chunk_id):
+        return self.chunk_store.doc_of(chunk_id)
+
+    def page_of(self, chunk_id):
+        """1-based page the chunk starts on, or None for formats without pages."""
+        return self.chunk_store.page_of(chunk_id)
+
+    def span_of(self, chunk_id):
+        """1-based (first, last) page, or data rows for tables; see ChunkStore.span_of."""
+        return self.chunk_store.span_of(chunk_id)
+
+    def id_filter(self, doc_ids):
+        """IdRanges covering the chunks of the given documents."""
+        return IdRanges([tuple(r) for doc_id in doc_ids for r in self.doc_ranges.get(doc_id, ())])
+
+    def get_vectors(self, ids):
+        """Stored (unit) vectors for chunk IDs, approximate for quantized storage; avoids re-embedding."""
+        if not len(ids):
+            return np.zeros((0, self.dim), dtype='float32')
+        return np.vstack([self.index.reconstruct(int(i)) for i in ids])
+
+    def _target_type(self):
+        n = len(self.chunk_store)
+        target = choose_index_type(n) if self.index_type == "auto" else self.index_type
+        # Trained indexes wait in flat form until there is enough data to train on
+        if n < _min_train_size(target, n):
+            return "flat"
+        return target
+
+    def _target_precision(self):
+        if self.precision == "int8" and len(self.chunk_store) < SQ_TRAIN_POINTS:
+            return "float32"
+        return self.precision
+
+    def _maybe_rebuild(self):
+        target = self._target_type()
+        # Auto mode only moves to cheaper indexes as the corpus grows
+        if self.index_type == "auto" and INDEX_TYPES.index(target) < INDEX_TYPES.index(self.active_type):
+            target = self.active_type
+        precision = self._target_precision()
+        if (target, precision) != (self.active_type, self.active_precision):
+            self._rebuild(target, precision)
+
+    def _rebuild(self, index_type, precision=None):
+        # Vectors are reconstructed from the current index, so nothing is re-embedded
+        precision = precision or self.active_precision
+        ids = self.chunk_store.ids().astype('int64')
+        vectors = self.get_vectors(ids)
+        index = build_index(index_type, self.dim, len(ids), precision)
+        if not index.is_trained:
+            sample_size = max(_nlist(len(ids)) * 256, SQ_TRAIN_SAMPLE)
+            sample = vectors[np.random.default_rng(0).permutation(len(vectors))[:sample_size]]
+            index.train(sample)
+        _enable_id_lookup(index)
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        self.index = index
+        self.active_type = index_type
+        self.active_precision = precision
+        self.deleted.clear()
+        self._tombstones = None
+
+    def _tombstone_selector(self):
+        if not self.deleted:
+            return None
+        if self._tombstones is None:
+            ids = np.fromiter(self.deleted, dtype='int64', count=len(self.deleted))
+            batch = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+            self._tombstones = (batch, faiss.IDSelectorNot(batch))
+        return self._tombstones[1]
+
+    def _search_params(self, nprobe=None, ef_search=None, allowed=None):
+        # Document filters and tombstones are applied inside FAISS through an ID selector, not on the results
+        parts = [sel for sel in (allowed.selector() if allowed is not None else None, self._tombstone_selector())
+                 if sel is not None]
+        selector = faiss.IDSelectorAnd(*parts) if len(parts) == 2 else parts[0] if parts else None
+        extra = {} if selector is None else {"sel": selector}
+        if self.active_type in ("ivf", "ivfpq"):
+            params = faiss.SearchParametersIVF(nprobe=nprobe or NPROBE, **extra)
+        elif self.active_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=ef_search or EF_SEARCH, **extra)
+        else:
+            params = faiss.SearchParameters(**extra) if extra else None
+        if params is not None:
+            params.referenced_objects = parts + [selector]  # FAISS holds raw pointers to these
+        return params
+
+    def _dense_ids(self, query_embeddings, top_k, nprobe=None, ef_search=None, allowed=None):
+        # One FAISS call for all queries
+        k = min(top_k, self.index.ntotal) or top_k
+        params = self._search_params(nprobe, ef_search, allowed)
+        D, I = self.index.search(_unit_rows(query_embeddings), k, params=params)
+        return [[int(i) for i in row if i != -1] for row in I]
+
+    def search_ids(self, query_embedding, top_k=3, nprobe=None, ef_search=None, mode="dense", query_text=None,
+                   doc_ids=None):
+        """Return chunk IDs, best first. mode is "dense", "sparse" (BM25) or "hybrid" (RRF of both).
+
+        doc_ids restricts the search to chunks of those documents.
+        """
+        query_texts = None if query_text is None else [query_text]
+        return self.search_ids_batch([query_embedding], top_k, nprobe, ef_search, mode, query_texts, doc_ids)[0]
+
+    def search_ids_batch(self, query_embeddings, top_k=3, nprobe=None, ef_search=None, mode="dense", query_texts=None,
+                         doc_ids=None):
+        """search_ids for many queries at once: returns one ID list per query."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != "dense" and (query_texts is None or not all(query_texts)):
+            raise ValueError(f"{mode} search needs query_text")
+        allowed = None if doc_ids is None else self.id_filter(doc_ids)
+        if allowed is not None and not allowed:
+            return [[] for _ in range(len(query_embeddings) if query_texts is None else len(query_texts))]
+        with metrics.span("search", mode=mode):
+            return self._search_ids_batch(query_embeddings, top_k, nprobe, ef_search, mode, query_texts, allowed)
+
+    def _search_ids_batch(self, query_embeddings, top_k, nprobe, ef_search, mode, query_texts, allowed):
+        if mode == "sparse":
+            return [[i for i, _ in self.sparse.search(text, top_k, allowed)] for text in query_texts]
+        if not len(query_embeddings):
+            return []
+        if mode == "dense":
+            return self._dense_ids(query_embeddings, top_k, nprobe, ef_search, allowed)
+        candidates = top_k * HYBRID_CANDIDATES
+        dense = self._dense_ids(query_embeddings, candidates, nprobe, ef_search, allowed)
+        return [
+            reciprocal_rank_fusion([ids, [i for i, _ in self.sparse.search(text, candidates, allowed)]])[:top_k]
+            for ids, text in zip(dense, query_texts)
+        ]
+
+    def search(self, query_embedding, top_k=3, nprobe=None, ef_search=None, mode="dense", query_text=None,
+               doc_ids=None):
+        ids = self.search_ids(query_embedding, top_k, nprobe, ef_search, mode=mode, query_text=query_text,
+                              doc_ids=doc_ids)
+        return [self.chunk_store[i] for i in ids]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        # meta.json is written last and removed first, so a half-written
+        # directory never loads
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        faiss.write_index(self.index, os.path.join(path, "index.faiss"))
+        # The loaded store memory-maps its text file, so write new files rather
+        # than overwrite one that a running retriever may still be reading
+        tag = uuid.uuid4().hex[:12]
+        chunk_files = [f"texts-{tag}.bin", f"columns-{tag}.npz"]
+        self.chunk_store.save(*(os.path.join(path, name) for name in chunk_files))
+        store = {
+            "documents": {
+                doc_id: {"version": self.doc_versions.get(doc_id), "ranges": ranges}
+                for doc_id, ranges in self.doc_ranges.items()
+            },
+            "deleted": sorted(self.deleted),
+        }
+        with open(os.path.join(path, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(store, f, ensure_ascii=False)
+        meta = {
+            "version": INDEX_FORMAT_VERSION,
+            "dim": self.dim,
+            "count": self.index.ntotal,
+            "next_id": self.next_id,
+            "content_version": self.version,
+            "index_type": self.index_type,
+            "active_type": self.active_type,
+            "precision": self.precision,
+            "active_precision": self.active_precision,
+            "chunk_files": chunk_files,
+        }
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        for stale in glob.glob(os.path.join(path, "texts-*.bin")) + glob.glob(os.path.join(path, "columns-*.npz")):
+            if os.path.basename(stale) not in chunk_files:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass  # Still mapped (Windows); removed by a later save
+
+    @classmethod
+    def load(cls, path, index_type=None, precision=None):
+        """Load a retriever saved with save(), or return None if absent or stale.
 
-    def add(self, embeddings, chunks):
-        self.index.add(np.array(embeddings).astype('float32'))
-        self.chunk_store.extend(chunks)
+        A precision other than the saved one converts the stored vectors.
+        """
+        try:
+            with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            return None
 
-    def search(self, query_embedding, top_k=3):
-        D, I = self.index.search(np.array([query_embedding]).astype('float32'), top_k)
-        return [self.chunk_store[i] for i in I[0]]
+        retriever = cls(meta["dim"], index_type=index_type or meta["index_type"],
+                        precision=precision or meta["precision"])
+        retriever.index = faiss.read_index(os.path.join(path, "index.faiss"))
+        _enable_id_lookup(retriever.index)
+        retriever.active_type = meta["active_type"]
+        retriever.active_precision = meta["active_precision"]
+        retriever.next_id = meta["next_id"]
+        retriever.version = meta.get("content_version", retriever.version)
+        with open(os.path.join(path, "chunks.json"), "r", encoding="utf-8") as f:
+            store = json.load(f)
+        texts_file, columns_file = meta["chunk_files"]
+        try:
+            retriever.chunk_store = ChunkStore.load(os.path.join(path, texts_file), os.path.join(path, columns_file))
+        except (OSError, ValueError):
+            return None
+        for doc_id, doc in store["documents"].items():
+            retriever.doc_ranges[doc_id] = doc["ranges"]
+            retriever.doc_versions[doc_id] = doc["version"]
+        retriever.deleted = set(store["deleted"])
+        retriever._tombstones = None
+        # Rebuilding the keyword index is a single tokenizing pass, cheaper than storing it
+        retriever.sparse.add(retriever.chunk_store.ids().tolist(), list(retriever.chunk_store.values()))
+        if (retriever.index.ntotal != len(retriever.chunk_store) + len(retriever.deleted)
+                or retriever.chunk_store.size != retriever.next_id):
+            return None
+        if retriever._target_precision() != retriever.active_precision:
+            retriever._rebuild(retriever.active_type, retriever._target_precision())
+        return retriever
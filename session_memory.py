@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import SystemMessage
+
+from context_builder import estimate_tokens, CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MODES = ("window", "summary")
+
+def message_tokens(messages):
+    return sum(estimate_tokens(message.content) for message in messages)
+
+def format_history(messages):
+    lines = []
+    for message in messages:
+        if message.type == "system":
+            lines.append(f"Earlier conversation (summary): {message.content}")
+        elif message.type == "human":
+            lines.append(f"User: {message.content}")
+        else:
+            lines.append(f"Assistant: {message.content}")
+    return "\n".join(lines)
+
+class BoundedChatHistory(BaseChatMessageHistory):
+    """Chat history capped at max_tokens.
+
+    Once over the cap the oldest turns are dropped ("window") or folded into a
+    rolling summary kept as the first message ("summary"). The latest turn is
+    always kept in full. With `defer` (e.g. an executor's submit) the summary is
+    made later instead of inside add_messages; until then the old turns stay.
+    """
+
+    def __init__(self, max_tokens=1000, mode="window", summarize=None, defer=None):
+        if mode not in MEMORY_MODES:
+            raise ValueError(f"Unknown memory mode: {mode}")
+        if mode == "summary" and summarize is None:
+            raise ValueError("summary mode needs a summarize function")
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.summarize = summarize  # (previous summary, transcript of dropped turns) -> summary
+        self.defer = defer
+        self.summary = ""
+        self.turns = []  # Messages after the summary, oldest first
+        self.tokens = 0
+        self.summarized_turns = 0
+        self.last_used = time.monotonic()
+        self._lock = threading.RLock()
+        self._compacting = False  # A deferred summary is queued or running
+
+    @property
+    def messages(self):
+        with self._lock:
+            if self.summary:
+                return [SystemMessage(content=self.summary)] + self.turns
+            return list(self.turns)
+
+    def add_messages(self, messages):
+        with self._lock:
+            self.turns.extend(messages)
+            self.last_used = time.monotonic()
+            self.tokens = message_tokens(self.messages)
+            if self.tokens <= self.max_tokens:
+                return
+            if self.mode == "summary" and self.defer is not None:
+                # Summarize later, e.g. after the answer that added these turns has released its LLM slot
+                if not self._compacting:
+                    self._compacting = True
+                    self.defer(self._trim)
+                return
+        self._trim()
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self.tokens = 0
+
+    def _trim(self):
+        with self._lock:
+            n = self._droppable()
+            dropped = self.turns[:n]
+            summary = None
+            previous = self.summary
+        # The summarizer is called without the lock, so the session stays usable meanwhile
+        if dropped and self.mode == "summary":
+            try:
+                summary = self.summarize(previous, format_history(dropped))
+            except Exception:
+                # Keep the cap even without a summary, but say which turns were lost
+                logger.warning("History summary failed; dropping %d messages unsummarized", n, exc_info=True)
+        with self._lock:
+            self._compacting = False
+            # A clear() while summarizing leaves nothing to drop or fold in
+            if not dropped or len(self.turns) < n or any(a is not b for a, b in zip(self.turns, dropped)):
+                self.tokens = message_tokens(self.messages)
+                return
+            if summary is not None:
+                # The summary gets at most half the budget, so it cannot crowd out recent turns
+                self.summary = summary.strip()[:self.max_tokens // 2 * CHARS_PER_TOKEN]
+                self.summarized_turns += sum(1 for message in dropped if message.type == "human")
+            # Only now are the turns removed, after the summary (if any) has taken them in
+            del self.turns[:n]
+            self.tokens = message_tokens(self.messages)
+            # Turns added while a deferred summary ran may need another one
+            if self.tokens > self.max_tokens and self.defer is not None and self._droppable():
+                self._compacting = True
+                self.defer(self._trim)
+
+    def _droppable(self):
+        # Whole turns (question + answer), oldest first, but never the latest one
+        n = 0
+        budget = self._turn_budget()
+        while len(self.turns) - n > 2 and message_tokens(self.turns[n:]) > budget:
+            n += 1
+            while len(self.turns) - n > 2 and self.turns[n].type != "human":
+                n += 1
+        return n
+
+    def _turn_budget(self):
+        if self.mode == "summary":
+            return self.max_tokens - self.max_tokens // 2
+        return self.max_tokens
+
+class SessionMemoryManager:
+    """Per-session chat histories with LRU and idle-time eviction of whole sessions."""
+
+    def __init__(self, max_sessions=100, idle_ttl=3600, max_tokens=1000, mode="window", summarize=None,
+                 defer=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.summarize = summarize
+        self.defer = defer
+        self.sessions = OrderedDict()  # session ID -> BoundedChatHistory, least recently used first
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        now = time.monotonic()
+        idle = [key for key, history in self.sessions.items() if now - history.last_used > self.idle_ttl]
+        for key in idle:
+            del self.sessions[key]
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+        self.evicted += len(idle)
+
+    def get(self, session_id):
+        """Return the session's history, creating it if needed."""
+        with self._lock:
+            history = self.sessions.get(session_id)
+            if history is None:
+                history = BoundedChatHistory(self.max_tokens, self.mode, self.summarize, self.defer)
+                self.sessions[session_id] = history
+            history.last_used = time.monotonic()
+            self.sessions.move_to_end(session_id)
+            self._evict()
+            return history
+
+    def peek(self, session_id):
+        """Return the session's history without creating it or refreshing its LRU position."""
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def reset(self, session_id):
+        with self._lock:
+            history = self.sessions.get(session_id)
+            if history is not None:
+                history.clear()
+
+    def drop(self, session_id):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            self._evict()
+            tokens = [history.tokens for history in self.sessions.values()]
+            return {
+                "sessions": len(tokens),
+                "history_tokens": sum(tokens),
+                "max_history_tokens": max(tokens, default=0),
+                "summarized_turns": sum(history.summarized_turns for history in self.sessions.values()),
+                "evicted": self.evicted,
+            }
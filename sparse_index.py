@@ -0,0 +1,88 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+# Keeps identifiers like "E-1042", "part_no.7" or "10.2.3" together as one token
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+SPLIT_RE = re.compile(r"[-_./:]")
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        tokens.append(token)
+        # Also index the parts, so "E-1042" matches a query for "1042"
+        if SPLIT_RE.search(token):
+            tokens.extend(part for part in SPLIT_RE.split(token) if part)
+    return tokens
+
+class BM25Index:
+    """Inverted index with BM25 scoring; queries only touch the posting lists of their terms."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {chunk ID: term frequency}
+        self.doc_len = {}  # chunk ID -> token count
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def copy(self):
+        clone = BM25Index(self.k1, self.b)
+        clone.postings = {term: dict(posting) for term, posting in self.postings.items()}
+        clone.doc_len = dict(self.doc_len)
+        clone.total_len = self.total_len
+        return clone
+
+    def add(self, ids, texts):
+        for chunk_id, text in zip(ids, texts):
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            length = sum(counts.values())
+            self.doc_len[chunk_id] = length
+            self.total_len += length
+
+    def remove(self, ids, texts):
+        # Texts are re-tokenized to find the postings to drop, instead of storing terms per chunk
+        for chunk_id, text in zip(ids, texts):
+            if chunk_id not in self.doc_len:
+                continue
+            for term in set(tokenize(text)):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+            self.total_len -= self.doc_len.pop(chunk_id)
+
+    def search(self, query, top_k=3, allowed=None):
+        """Return up to top_k (chunk ID, score) pairs, best first; allowed restricts the candidate IDs."""
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avg_len = self.total_len / n
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in posting.items():
+                if allowed is not None and chunk_id not in allowed:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[chunk_id] / avg_len)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked ID lists; each list contributes 1 / (k + rank) per ID."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import (
+    LLM_MODEL, SUMMARY_CACHE_DIR, SUMMARY_CONCURRENCY,
+    SUMMARY_SECTION_CHARS, SUMMARY_MAX_SECTIONS, SUMMARY_REDUCE_FANIN,
+)
+from chunker import join_chunks
+from qa_engine import summarize_text, summarize_section, combine_summaries
+
+# Bump when the prompts or the map-reduce strategy change so old summaries are redone
+SUMMARY_VERSION = 1
+
+def summary_key(content_key, model=LLM_MODEL):
+    raw = f"{SUMMARY_VERSION}:{model}:{content_key}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def split_sections(chunks, section_chars=SUMMARY_SECTION_CHARS, max_sections=SUMMARY_MAX_SECTIONS):
+    """Group consecutive chunks into sections of about section_chars.
+
+    Documents with more than max_sections sections are represented by evenly
+    spaced sections, which bounds the number of LLM calls per document.
+    """
+    chunk_chars = sum(len(chunk) for chunk in chunks) / len(chunks) if chunks else 1
+    per_section = max(1, int(section_chars // max(1, chunk_chars)))
+    groups = [chunks[i:i + per_section] for i in range(0, len(chunks), per_section)]
+    if len(groups) > max_sections > 1:
+        step = (len(groups) - 1) / (max_sections - 1)
+        groups = [groups[round(i * step)] for i in range(max_sections)]
+    return [join_chunks(group) for group in groups]
+
+class Summarizer:
+    """Map-reduce document summaries in the background, cached on disk by content key.
+
+    LLM calls from all documents share one pool, so at most `concurrency` run at once.
+    """
+
+    def __init__(self, concurrency=SUMMARY_CONCURRENCY, cache_dir=SUMMARY_CACHE_DIR, doc_workers=4):
+        self.cache_dir = cache_dir
+        self.llm_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="summary-llm")
+        self.doc_pool = ThreadPoolExecutor(max_workers=doc_workers, thread_name_prefix="summary-doc")
+        self.pending = {}  # key -> Future, so re-uploads share in-flight work
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def cached(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _store(self, key, summary):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(summary)
+        os.replace(path + ".tmp", path)
+
+    def submit(self, key, load_chunks):
+        """Return a Future for the summary of the document whose chunks load_chunks() returns."""
+        summary = self.cached(key)
+        if summary is not None:
+            future = Future()
+            future.set_result(summary)
+            return future
+        with self._lock:
+            future = self.pending.get(key)
+            if future is None:
+                future = self.doc_pool.submit(self._summarize, key, load_chunks)
+                self.pending[key] = future
+            return future
+
+    def _summarize(self, key, load_chunks):
+        try:
+            sections = split_sections(load_chunks())
+            if not sections:
+                return "(No text found in this document.)"
+            if len(sections) == 1:
+                summary = self.llm_pool.submit(summarize_text, sections[0], len(sections[0])).result()
+            else:
+                # Map over sections, then reduce in groups until one summary is left
+                summaries = list(self.llm_pool.map(summarize_section, sections))
+                fanin = max(2, SUMMARY_REDUCE_FANIN)
+                while len(summaries) > 1:
+                    groups = [summaries[i:i + fanin] for i in range(0, len(summaries), fanin)]
+                    summaries = list(self.llm_pool.map(combine_summaries, groups))
+                summary = summaries[0]
+            self._store(key, summary)
+            return summary
+        finally:
+            with self._lock:
+                self.pending.pop(key, None)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_builder import build_context
+
+class FakeRetriever:
+    def __init__(self, docs):
+        # docs: [(doc ID, [chunk texts])]; chunk IDs are consecutive across documents
+        self.chunk_store = []
+        self.docs = []
+        for doc_id, chunks in docs:
+            self.chunk_store.extend(chunks)
+            self.docs.extend([doc_id] * len(chunks))
+
+    def document_of(self, chunk_id):
+        return self.docs[chunk_id]
+
+    def span_of(self, chunk_id):
+        return chunk_id + 1, chunk_id + 1
+
+def test_non_overlapping_neighbours_are_separated():
+    retriever = FakeRetriever([("a.pdf", ["Alpha beta gamma delta epsilon zeta theta.", "Eta iota kappa lambda mu."])])
+    passages, stats = build_context(retriever, [0, 1], mmr_lambda=None)
+    assert passages == ["Alpha beta gamma delta epsilon zeta theta. Eta iota kappa lambda mu."]
+    assert stats["merged_chunks"] == 1
+    assert stats["sources"] == [("a.pdf", 1, 2)]
+
+def test_overlapping_neighbours_keep_the_overlap_once():
+    retriever = FakeRetriever([("a.pdf", ["One two three. Four five six.", "Four five six. Seven eight nine."])])
+    passages, _ = build_context(retriever, [1, 0], mmr_lambda=None)
+    assert passages == ["One two three. Four five six. Seven eight nine."]
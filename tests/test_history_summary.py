@@ -0,0 +1,38 @@
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake import FakeListLLM
+
+import qa_engine
+from llm_scheduler import LLMScheduler
+from session_memory import SessionMemoryManager
+
+def test_summary_mode_with_one_llm_slot(monkeypatch, caplog):
+    # One slot and a short timeout: a summary that waited for the answer's slot would time out
+    monkeypatch.setattr(qa_engine, "scheduler", LLMScheduler(1, 1, timeouts=(3, 3, 3)))
+    monkeypatch.setattr(qa_engine, "memory", SessionMemoryManager(
+        max_tokens=60, mode="summary", summarize=qa_engine.summarize_history, defer=qa_engine.memory.defer))
+    qa_engine.set_llm(FakeListLLM(responses=["The pump is inspected every 500 hours. " * 3]))
+    try:
+        with caplog.at_level(logging.WARNING):
+            for i in range(4):
+                start = time.perf_counter()
+                answer = "".join(qa_engine.stream_answer_with_memory(["Pump manual."], f"Question {i}?", "s"))
+                assert answer
+                assert time.perf_counter() - start < 1.0
+            history = qa_engine.memory.peek("s")
+            deadline = time.monotonic() + 5
+            while history._compacting and time.monotonic() < deadline:
+                time.sleep(0.01)
+    finally:
+        qa_engine.set_llm(None)
+
+    assert not history._compacting
+    assert history.summary
+    assert history.summarized_turns > 0
+    assert len(history.turns) == 2  # Only the latest turn is kept in full
+    assert "still queued" not in caplog.text
@@ -108,88 +108,336 @@
 # demo.launch()
 
 import gradio as gr
-import os
 import tempfile
 import json
-from pdf2image import convert_from_path
-from pdf_parser import extract_text_from_multiple_files, chunk_text
-from embedder import get_embeddings
+import threading
+import logging
+import time
+from concurrent.futures import as_completed
+from functools import partial
+from embedder import embed_query, embedding_dim, MODEL_NAME
 from retriever import FAISSRetriever
+from ingest import ingest_documents, document_id
+from config import INDEX_DIR, SERVER_HOST, SERVER_PORT, SEARCH_MODE, RETRIEVE_TOP_K
+from context_builder import build_context, format_source
+from config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_PATH
+from config import CHAT_CONCURRENCY, PER_SESSION_DOCS, VECTOR_PRECISION, PREVIEW_DIR, PROFILE_ENDPOINT
+from answer_cache import SemanticAnswerCache
+from summarizer import Summarizer, summary_key
+from previews import Previewer
+from chunker import chunking_params
+import embedding_cache
+import embedder
+import qa_engine
+import metrics
 from qa_engine import (
-    generate_answer_with_memory,
+    stream_answer_with_memory,
+    has_history,
+    record_exchange,
     reset_memory,
-    summarize_text,
-    generate_followups
+    generate_followups,
+    cancel_session,
 )
+from llm_scheduler import LLMTimeout, LLMCancelled
+
+logger = logging.getLogger(__name__)
+
+summarizer = Summarizer()
+previewer = Previewer()
+
+class Collection:
+    """Indexed documents, their summaries and answer cache, shared by one or more sessions.
+
+    Questions read `retriever` once and search that snapshot without locking. Uploads
+    take `write_lock`, change a copy and then publish it, so a search never sees a
+    half-applied upload and never waits for one.
+    """
+
+    def __init__(self, index_dir=None, answer_cache_path=None):
+        self.retriever = None
+        self.summaries = {}
+        self.index_dir = index_dir  # Only the shared collection is saved to disk
+        self.write_lock = threading.Lock()
+        self.answer_cache = SemanticAnswerCache(
+            threshold=ANSWER_CACHE_THRESHOLD,
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl=ANSWER_CACHE_TTL,
+            path=answer_cache_path,
+        )
+
+shared = Collection(index_dir=INDEX_DIR, answer_cache_path=ANSWER_CACHE_PATH)
+session_collections = {}  # session hash -> Collection, with PDFQA_PER_SESSION_DOCS=1
+_collections_lock = threading.Lock()
+
+def get_collection(session_id):
+    if not PER_SESSION_DOCS:
+        return shared
+    with _collections_lock:
+        return session_collections.setdefault(session_id, Collection())
+
+def end_session(request: gr.Request):
+    # Browser tab closed: stop its LLM calls, free its chat memory and private documents
+    cancel_session(request.session_hash)
+    qa_engine.memory.drop(request.session_hash)
+    with _collections_lock:
+        session_collections.pop(request.session_hash, None)
+
+# ---------------- Startup & health ----------------
+
+warmup_state = {}  # component -> "loading" | "ready" | "error: ..."
+
+def _load_index():
+    loaded = FAISSRetriever.load(INDEX_DIR, precision=VECTOR_PRECISION)  # Reuse the index from the last run
+    with shared.write_lock:
+        if shared.retriever is None:
+            shared.retriever = loaded
+
+def _warm(name, fn):
+    try:
+        fn()
+        warmup_state[name] = "ready"
+    except Exception as e:
+        warmup_state[name] = f"error: {e}"
+
+def start_warmup():
+    # Heavy components load in the background so the server answers immediately
+    for name, fn in (("index", _load_index), ("embedder", embedder.warmup), ("llm", qa_engine.warmup)):
+        warmup_state[name] = "loading"
+        threading.Thread(target=_warm, args=(name, fn), daemon=True).start()
+
+def health():
+    return {
+        "status": "ok",
+        "ready": all(state == "ready" for state in warmup_state.values()),
+        "components": dict(warmup_state),
+        "memory": qa_engine.memory_stats(),
+        "llm": qa_engine.scheduler_stats(),
+        "sessions_with_documents": len(session_collections),
+    }
 
-retriever = None
-summaries = {}
-all_chunks = []
-session_id = "default_session"
+def _gauges():
+    memory = qa_engine.memory_stats()
+    cache = shared.answer_cache.stats()
+    embed = embedder.get_stats()
+    llm = qa_engine.scheduler_stats()
+    return {
+        "pdfqa_llm_running": llm["running"],
+        "pdfqa_llm_queued": sum(llm["queued"].values()),
+        "pdfqa_index_chunks": len(shared.retriever.chunk_store) if shared.retriever else 0,
+        "pdfqa_memory_sessions": memory["sessions"],
+        "pdfqa_memory_history_tokens": memory["history_tokens"],
+        "pdfqa_memory_evicted_sessions": memory["evicted"],
+        "pdfqa_sessions_with_documents": len(session_collections),
+        "pdfqa_answer_cache_entries": cache["entries"],
+        "pdfqa_answer_cache_hit_rate": cache["hit_rate"],
+        "pdfqa_query_embedding_cache_hit_rate": embed["query_hit_rate"],
+        "pdfqa_embed_chunks_per_second": embed["chunks_per_sec"],
+    }
 
-def process_docs(files):
-    global retriever, summaries, all_chunks
+metrics.register_gauges(_gauges)
+
+def _format_summaries(summaries, doc_order, errors):
+    parts = []
+    for doc_id in doc_order:
+        if doc_id in errors:
+            parts.append(f"⚠️ {doc_id}: could not be processed ({errors[doc_id]})")
+        elif doc_id in summaries:
+            parts.append(f"📄 {doc_id}:\n{summaries[doc_id]}")
+        else:
+            parts.append(f"📄 {doc_id}:\n⏳ Summarizing…")
+    return "\n\n".join(parts)
+
+def _filter_choices(collection):
+    documents = collection.retriever.documents() if collection.retriever else []
+    return gr.update(choices=documents, value=[])
+
+def _gallery(previews):
+    # Finished thumbnails in upload order
+    return [future.result() for future in previews.values() if future.done() and future.result()]
+
+def _collect_summary(summaries, doc_id, future):
+    # A failed summary (e.g. Ollama unreachable) is shown in place; the document stays indexed
+    try:
+        summaries[doc_id] = future.result()
+    except Exception as e:
+        logger.warning("Summary of %s failed: %s", doc_id, e)
+        summaries[doc_id] = f"⚠️ Summary failed: {e}"
+
+def process_docs(files, request: gr.Request):
+    yield from metrics.profiled(_process_docs(files, request), "process_docs")
+
+def _process_docs(files, request):
+    collection = get_collection(request.session_hash)
+    summaries = collection.summaries
     file_paths = [f.name for f in files]
 
-    texts_by_file = extract_text_from_multiple_files(file_paths)
-    all_chunks = []
-    summaries = {}
-
-    for file, text in texts_by_file.items():
-        summaries[file] = summarize_text(text)
-        chunks = chunk_text(text)
-        all_chunks.extend(chunks)
-
-    embeddings = get_embeddings(all_chunks)
-    retriever = FAISSRetriever(dim=len(embeddings[0]))
-    retriever.add(embeddings, all_chunks)
-
-    summary_output = "\n\n".join(
-        [f"📄 {os.path.basename(f)}:\n{summaries[f]}" for f in summaries]
-    )
-
-    previews = []
-    for file_path in file_paths:
-        if file_path.endswith(".pdf"):
-            with tempfile.TemporaryDirectory() as temp_dir:
-                images = convert_from_path(file_path, first_page=1, last_page=1, fmt="jpeg", output_folder=temp_dir)
-                if images:
-                    previews.append(images[0])
-
-    return summary_output, previews
-
-def chat(user_input, chat_history):
+    # Only files whose content (or chunking/model settings) changed get parsed and embedded;
+    # documents already indexed, including other users' uploads, stay until removed explicitly
+    hashes = {path: embedding_cache.file_hash(path) for path in file_paths}
+    doc_ids = {path: document_id(path, hashes[path]) for path in file_paths}
+    doc_order = list(dict.fromkeys(doc_ids.values()))
+    keys = {path: embedding_cache.cache_key(hashes[path], MODEL_NAME, chunking_params()) for path in file_paths}
+
+    with collection.write_lock:
+        current = collection.retriever
+        stale = [(f, doc_ids[f], keys[f]) for f in file_paths
+                 if not (current and current.has_document(doc_ids[f], keys[f]))]
+        errors = {}
+        if current is None or stale:
+            # Questions keep searching the current snapshot while the copy is updated
+            retriever = current.copy() if current else FAISSRetriever(dim=embedding_dim())
+
+            # Pages stream through parse -> chunk -> embed -> index in bounded batches;
+            # several new files are parsed in parallel worker processes
+            with metrics.span("ingest"):
+                _, errors = ingest_documents(stale, retriever)
+            for _, doc_id, _ in stale:
+                summaries.pop(doc_id, None)
+
+            if collection.index_dir:
+                retriever.save(collection.index_dir)
+            collection.retriever = retriever
+
+    # The index is queryable from here on; summaries and previews fill in as they complete
+    pending = {}
+    for file in file_paths:
+        doc_id = doc_ids[file]
+        if doc_id not in summaries and doc_id not in errors:
+            future = summarizer.submit(summary_key(keys[file]), partial(embedding_cache.load_chunks, keys[file]))
+            pending[future] = doc_id
+    previews = {file: previewer.submit(file, hashes[file]) for file in file_paths if file.lower().endswith(".pdf")}
+    for future in [f for f in pending if f.done()]:
+        _collect_summary(summaries, pending.pop(future), future)
+    yield _format_summaries(collection.summaries, doc_order, errors), _gallery(previews), _filter_choices(collection)
+
+    for future in as_completed(set(pending) | set(previews.values())):
+        doc_id = pending.get(future)
+        if doc_id is not None:
+            _collect_summary(summaries, doc_id, future)
+        yield _format_summaries(collection.summaries, doc_order, errors), _gallery(previews), gr.update()
+
+def remove_docs(doc_ids, request: gr.Request):
+    # Drops the chosen documents' chunks without re-embedding the rest
+    collection = get_collection(request.session_hash)
+    with collection.write_lock:
+        current = collection.retriever
+        doc_ids = [doc_id for doc_id in doc_ids or [] if current and current.has_document(doc_id)]
+        if doc_ids:
+            retriever = current.copy()
+            for doc_id in doc_ids:
+                retriever.remove_document(doc_id)
+                collection.summaries.pop(doc_id, None)
+            if collection.index_dir:
+                retriever.save(collection.index_dir)
+            collection.retriever = retriever
+    return _filter_choices(collection)
+
+def chat(user_input, chat_history, doc_filter, request: gr.Request):
+    yield from metrics.profiled(_chat(user_input, chat_history, doc_filter, request), "chat")
+
+def _chat(user_input, chat_history, doc_filter, request):
+    session_id = request.session_hash
+    collection = get_collection(session_id)
+    retriever = collection.retriever  # Snapshot; uploads publish a new one instead of changing it
+    answer_cache = collection.answer_cache
+    if not retriever and collection is shared and warmup_state.get("index") == "loading":
+        yield "⏳ Still loading the saved index, try again in a moment.", chat_history, None
+        return
     if not retriever:
-        yield "⚠️ Please upload and process files first.", chat_history, "", "", ""
+        yield "⚠️ Please upload and process files first.", chat_history, None
+        return
 
+    start = time.perf_counter()
+    metrics.inc("pdfqa_questions_total")
     chat_history.append({"role": "user", "content": user_input})
     chat_history.append({"role": "assistant", "content": "🤔 Thinking..."})
-    yield "", chat_history, "", "", ""
-
-    query_embedding = get_embeddings([user_input])[0]
-    top_chunks = retriever.search(query_embedding)
-
-    answer = generate_answer_with_memory(top_chunks, user_input, session_id=session_id)
-    followups = generate_followups(user_input, answer)
-    context = "\n---\n".join(top_chunks)
-
-    suggestions = "\n\n💡 *Follow-up Suggestions:*"
-    for i, q in enumerate(followups[:3]):
-        suggestions += f"\n`#{i+1}` {q}"
-
-    full_response = f"{answer}\n\n🔍 *Context used:*\n{context}{suggestions}"
-
-    chat_history = chat_history[:-1]
-    chat_history.append({"role": "assistant", "content": full_response})
-
-    btn_1 = followups[0] if len(followups) > 0 else ""
-    btn_2 = followups[1] if len(followups) > 1 else ""
-    btn_3 = followups[2] if len(followups) > 2 else ""
-
-    yield "", chat_history, btn_1, btn_2, btn_3
-
-def clear_chat():
-    reset_memory(session_id=session_id)
+    yield "", chat_history, None
+
+    stage_start = time.perf_counter()
+    query_embedding = embed_query(user_input)
+    embed_s = time.perf_counter() - stage_start
+
+    # With prior turns in memory the answer depends on the conversation, so only
+    # first questions are served from (and stored in) the answer cache; answers
+    # restricted to some documents are not cached either
+    doc_ids = doc_filter or None
+    cacheable = not has_history(session_id) and doc_ids is None
+    cached = answer_cache.lookup(query_embedding, retriever.version) if cacheable else None
+    if cached is not None:
+        metrics.inc("pdfqa_answer_cache_hits_total")
+        record_exchange(user_input, cached["answer"], session_id=session_id)
+        logger.info("Answer cache hit for %r (cached question %r)", user_input, cached["question"])
+        context = "\n---\n".join(cached["context"])
+        chat_history[-1] = {"role": "assistant", "content": f"{cached['answer']}\n\n🔍 *Context used:*\n{context}"}
+        yield "", chat_history, {"question": user_input, "answer": cached["answer"]}
+        return
+
+    stage_start = time.perf_counter()
+    ids = retriever.search_ids(query_embedding, top_k=RETRIEVE_TOP_K, mode=SEARCH_MODE, query_text=user_input,
+                               doc_ids=doc_ids)
+    search_s = time.perf_counter() - stage_start
+    # Merge overlapping neighbours, drop near-duplicates and fit the prompt token budget
+    stage_start = time.perf_counter()
+    top_chunks, context_stats = build_context(retriever, ids, query_embedding=query_embedding)
+    context_s = time.perf_counter() - stage_start
+    logger.info("Context: %(context_tokens)d tokens from %(retrieved_tokens)d retrieved "
+                "(%(merged_chunks)d merged, %(duplicates_dropped)d duplicates dropped)", context_stats)
+
+    # Stream tokens into the chat as Ollama produces them
+    answer = ""
+    first_token_s = None
+    try:
+        for token in stream_answer_with_memory(top_chunks, user_input, session_id=session_id):
+            if first_token_s is None:
+                first_token_s = time.perf_counter() - start
+            answer += token
+            chat_history[-1] = {"role": "assistant", "content": answer}
+            yield "", chat_history, None
+    except LLMTimeout:
+        chat_history[-1] = {"role": "assistant", "content": (answer + "\n\n" if answer else "")
+                            + "⚠️ The model is busy and did not answer in time, please try again."}
+        yield "", chat_history, None
+        return
+    except LLMCancelled:
+        chat_history[-1] = {"role": "assistant", "content": (answer + "\n\n" if answer else "") + "⏹️ Stopped."}
+        yield "", chat_history, None
+        return
+    total_s = time.perf_counter() - start
+    logger.info("Answer: embed %.0fms, search %.0fms, context %.0fms, first token after %.2fs, complete after %.2fs",
+                embed_s * 1e3, search_s * 1e3, context_s * 1e3, first_token_s or total_s, total_s)
+
+    if cacheable and answer:
+        answer_cache.store(user_input, query_embedding, answer, top_chunks, retriever.version)
+
+    context = "\n---\n".join(f"[{format_source(source)}]\n{text}"
+                              for text, source in zip(top_chunks, context_stats["sources"]))
+    chat_history[-1] = {"role": "assistant", "content": f"{answer}\n\n🔍 *Context used:*\n{context}"}
+    yield "", chat_history, {"question": user_input, "answer": answer}
+
+def suggest_followups(last_qa, chat_history, request: gr.Request):
+    # Chained after chat(), so follow-ups never delay the answer itself
+    if not last_qa:
+        return (chat_history,) + tuple(gr.update(visible=False) for _ in range(3))
+
+    try:
+        followups = generate_followups(last_qa["question"], last_qa["answer"], session_id=request.session_hash)[:3]
+    except (LLMTimeout, LLMCancelled):
+        followups = []  # Suggestions are optional; skip them rather than keep the user waiting
+    if followups:
+        suggestions = "\n\n💡 *Follow-up Suggestions:*"
+        for i, q in enumerate(followups):
+            suggestions += f"\n`#{i+1}` {q}"
+        chat_history[-1] = {"role": "assistant", "content": chat_history[-1]["content"] + suggestions}
+
+    buttons = [gr.update(value=q, visible=True) for q in followups]
+    buttons += [gr.update(value="", visible=False)] * (3 - len(followups))
+    return (chat_history,) + tuple(buttons)
+
+def stop_chat(request: gr.Request):
+    cancel_session(request.session_hash)
+
+def clear_chat(request: gr.Request):
+    reset_memory(session_id=request.session_hash)
     return [], "Memory cleared."
 
 def export_qa_log(summary, chat_log):
@@ -210,10 +458,10 @@ def export_qa_json(summary, chat_log):
         "summary": summary,
         "chat": chat_log
     }
-    path = os.path.join(tempfile.gettempdir(), "qa_session.json")
-    with open(path, "w", encoding="utf-8") as f:
+    # A unique file per export, so concurrent users never overwrite each other's download
+    with tempfile.NamedTemporaryFile(delete=False, prefix="qa_session_", suffix=".json", mode="w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
-    return path
+        return f.name
 
 def download_log(summary, chat_log):
     return gr.File.update(value=export_qa_log(summary, chat_log), visible=True)
@@ -227,7 +475,7 @@ with gr.Blocks() as demo:
     gr.Markdown("# 🧠 Offline AI Document Assistant")
 
     with gr.Row():
-        doc_input = gr.File(file_types=[".pdf", ".docx", ".txt", ".csv"], file_count="multiple", label="Upload Documents")
+        doc_input = gr.File(file_types=[".pdf", ".docx", ".txt", ".csv", ".tsv"], file_count="multiple", label="Upload Documents")
         summary_box = gr.Textbox(label="📄 Document Summaries", lines=20)
         load_btn = gr.Button("Process Documents")
 
@@ -240,8 +488,13 @@ with gr.Blocks() as demo:
     with gr.Row():
         user_input = gr.Textbox(placeholder="Ask something about the uploaded documents…")
         send_btn = gr.Button("Ask")
+        stop_btn = gr.Button("Stop")
         clear_btn = gr.Button("Reset Memory")
 
+    with gr.Row():
+        doc_filter = gr.Dropdown(choices=[], multiselect=True, label="🔎 Only search these documents (empty = all)")
+        remove_btn = gr.Button("🗑️ Remove Selected Documents")
+
     with gr.Row():
         followup_1 = gr.Button(visible=False)
         followup_2 = gr.Button(visible=False)
@@ -254,13 +507,28 @@ with gr.Blocks() as demo:
         download_json_btn = gr.Button("⬇️ Export as JSON")
         download_json_file = gr.File(label="Download .json", visible=False)
 
-    load_btn.click(fn=process_docs, inputs=[doc_input], outputs=[summary_box, preview_gallery])
+    load_btn.click(fn=process_docs, inputs=[doc_input], outputs=[summary_box, preview_gallery, doc_filter])
+    remove_btn.click(fn=remove_docs, inputs=[doc_filter], outputs=[doc_filter])
+
+    last_qa = gr.State(None)
 
-    send_btn.click(
+    # Answers and follow-ups share one pool of CHAT_CONCURRENCY LLM workers
+    chat_event = send_btn.click(
         fn=chat,
-        inputs=[user_input, chatbot],
-        outputs=[user_input, chatbot, followup_1, followup_2, followup_3],
+        inputs=[user_input, chatbot, doc_filter],
+        outputs=[user_input, chatbot, last_qa],
+        concurrency_limit=CHAT_CONCURRENCY,
+        concurrency_id="llm",
     )
+    followups_event = chat_event.then(
+        fn=suggest_followups,
+        inputs=[last_qa, chatbot],
+        outputs=[chatbot, followup_1, followup_2, followup_3],
+        concurrency_id="llm",
+    )
+
+    # Frees the LLM slot at once, whether the answer is still queued or streaming
+    stop_btn.click(fn=stop_chat, cancels=[chat_event, followups_event])
 
     clear_btn.click(fn=clear_chat, outputs=[chatbot, summary_box])
 
@@ -271,5 +539,49 @@ with gr.Blocks() as demo:
     download_btn.click(fn=download_log, inputs=[summary_box, chatbot], outputs=[download_file])
     download_json_btn.click(fn=download_json, inputs=[summary_box, chatbot], outputs=[download_json_file])
 
-demo.launch()
-# demo.launch(share=True)  # Uncomment to enable public sharing
\ No newline at end of file
+    demo.unload(end_session)
+
+demo.queue(default_concurrency_limit=CHAT_CONCURRENCY)
+
+def create_app():
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+
+    @app.get("/health")
+    def health_endpoint():
+        return health()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    if PROFILE_ENDPOINT:
+        @app.post("/debug/profile")
+        def profile_endpoint(count: int = 1):
+            # The next `count` chat or upload requests are profiled to PROFILE_DIR
+            return {"armed": metrics.profile_next(count)}
+
+    # Thumbnails are served straight from the preview cache
+    return gr.mount_gradio_app(app, demo, path="/", allowed_paths=[PREVIEW_DIR])
+
+def start_server(host=SERVER_HOST, port=SERVER_PORT):
+    """Serve the UI from a background thread; set `should_exit` on the result to stop it."""
+    import uvicorn
+
+    start_warmup()
+    server = uvicorn.Server(uvicorn.Config(create_app(), host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    return server
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    import uvicorn
+
+    start_warmup()
+    uvicorn.run(create_app(), host=host, port=port)
+
+if __name__ == "__main__":
+    # Guarded so extraction worker processes can import this module safely
+    serve()
+    # demo.launch(share=True)  # Uncomment to enable public sharing
\ No newline at end of file